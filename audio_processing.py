@@ -1,15 +1,97 @@
 """Audio processing functions for Practice Buddy Bot"""
+import os
+import functools
 import librosa
 import numpy as np
-from scipy import signal
-from config import AUDIO_PARAMS, METRONOME_PARAMS
+from scipy import ndimage, signal, stats
+from config import AUDIO_PARAMS, METRONOME_PARAMS, LIBROSA_CACHE_PARAMS, PITCH_BACKEND, TARGET_SR
 
+# pyworld is optional - extract_pitch falls back to YIN without it
+try:
+    import pyworld
+    HAS_PYWORLD = True
+except ImportError:
+    HAS_PYWORLD = False
 
-def load_audio(filepath):
-    """Load audio file and extract basic properties"""
+# Note names for mapping, indexed by pitch class (MIDI % 12)
+NOTE_NAMES = np.array(['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'])
+
+# Equal-tempered frequency of every MIDI note (MIDI 69 = A4 = 440 Hz)
+IDEAL_FREQ_TABLE = (440.0 * 2 ** ((np.arange(128) - 69) / 12)).astype(np.float32)
+
+# Name (pitch class + octave) of every MIDI note, e.g. 69 -> 'A4'
+MIDI_NOTE_NAMES = np.char.add(NOTE_NAMES[np.arange(128) % 12], (np.arange(128) // 12 - 1).astype(str))
+
+
+def trim_librosa_cache():
+    """Clear librosa's disk cache once it grows beyond the configured size"""
+    cache_dir = librosa.cache.memory.location
+    if cache_dir is None or not os.path.isdir(cache_dir):
+        return
+    
+    size_bytes = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            try:
+                size_bytes += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # File removed while walking
+    
+    if size_bytes > LIBROSA_CACHE_PARAMS['max_size_mb'] * 1024 * 1024:
+        librosa.cache.clear(warn=False)
+
+
+def _decode_with_av(src):
+    """Decode to mono float32 at TARGET_SR in-process with PyAV"""
+    import av
+    
+    with av.open(src) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=TARGET_SR)
+        
+        chunks = []
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray().ravel())
+        
+        # Flush samples still buffered in the resampler
+        for out in resampler.resample(None):
+            chunks.append(out.to_ndarray().ravel())
+    
+    return np.concatenate(chunks).astype(np.float32, copy=False), TARGET_SR
+
+
+def _decode_with_soundfile(src):
+    """Decode with libsndfile (Opus needs >= 1.0.29), downmix and resample with soxr"""
+    import soundfile as sf
+    import soxr
+    
+    y, sr = sf.read(src, dtype='float32', always_2d=False)
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    if sr != TARGET_SR:
+        y = soxr.resample(y, sr, TARGET_SR, quality='HQ')
+    return np.ascontiguousarray(y, dtype=np.float32), TARGET_SR
+
+
+def load_audio(src):
+    """Load audio (path or file-like object) and extract basic properties"""
     try:
-        # Load audio file
-        y, sr = librosa.load(filepath, sr=None)
+        # Decode in-process (no ffmpeg subprocess for OGG/Opus voice
+        # messages): PyAV, then libsndfile, then librosa for anything else
+        y = None
+        for decode in (_decode_with_av, _decode_with_soundfile):
+            try:
+                y, sr = decode(src)
+                break
+            except Exception:
+                if hasattr(src, 'seek'):
+                    src.seek(0)
+        if y is None:
+            y, sr = librosa.load(src, sr=TARGET_SR, res_type='soxr_hq')
+        
+        # float32 from here on - every downstream pass moves half the bytes
+        y = np.ascontiguousarray(y, dtype=np.float32)
         
         # Calculate duration
         duration = librosa.get_duration(y=y, sr=sr)
@@ -33,116 +115,197 @@ def load_audio(filepath):
         }
 
 
-def detect_metronome(y, sr):
-    """Detect metronome beeps/ticks and calculate tempo using periodicity"""
-    try:
-        # Band-pass filter for mechanical metronome
-        sos = signal.butter(4, [800, 4000], 'bp', fs=sr, output='sos')
-        y_filtered = signal.sosfilt(sos, y)
-        
-        # Get onset strength envelope
-        onset_env = librosa.onset.onset_strength(
-            y=y_filtered,
-            sr=sr,
-            hop_length=AUDIO_PARAMS['hop_length']
-        )
-        
-        # Detect ALL potential onsets (lenient detection)
-        onset_frames = librosa.onset.onset_detect(
-            onset_envelope=onset_env,
-            sr=sr,
-            hop_length=AUDIO_PARAMS['hop_length'],
-            backtrack=False,
-            pre_max=10,
-            post_max=10,
-            pre_avg=50,
-            post_avg=50,
-            delta=0.15,
-            wait=int(0.3 * sr / AUDIO_PARAMS['hop_length']),
-            units='frames'
-        )
-        
-        # Convert frames to time
-        onset_times = librosa.frames_to_time(
-            onset_frames, 
-            sr=sr, 
-            hop_length=AUDIO_PARAMS['hop_length']
-        )
-        
-        if len(onset_times) < 3:
+def compute_spectrogram(y, sr):
+    """Magnitude STFT for the onset detectors - computed in the stage that
+    uses it, so it is never pickled between processes"""
+    return np.abs(librosa.stft(
+        y,
+        n_fft=AUDIO_PARAMS['n_fft'],
+        hop_length=AUDIO_PARAMS['hop_length']
+    ))
+
+
+def _onset_envelope(S, sr):
+    """Onset strength from a magnitude STFT (same log-mel features as the y= path)"""
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr)
+    return librosa.onset.onset_strength(
+        S=librosa.power_to_db(mel),
+        sr=sr,
+        n_fft=AUDIO_PARAMS['n_fft'],
+        hop_length=AUDIO_PARAMS['hop_length']
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _click_band(sr):
+    """Boolean mask of the STFT bins inside the metronome click band"""
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=AUDIO_PARAMS['n_fft'])
+    band = (freqs >= METRONOME_PARAMS['band_low']) & (freqs <= METRONOME_PARAMS['band_high'])
+    band.flags.writeable = False  # Shared between calls
+    return band
+
+
+# The heavy stages below are memoized on their inputs in librosa's disk cache
+# (joblib), so a resent recording skips straight to the cached results. They
+# store features only (onsets, pitch track, notes), never the audio.
+_disk_cache = librosa.cache(level=LIBROSA_CACHE_PARAMS['level'])
+
+
+def cache_stage(func):
+    """Memoize a stage that raises on failure - joblib keeps only what a call
+    returns, so an error is never cached - and turn the exception into the
+    usual {'success': False, 'error': ...} result outside the cached call"""
+    cached = _disk_cache(func)
+    
+    @functools.wraps(func)
+    def stage(*args, **kwargs):
+        try:
+            return cached(*args, **kwargs)
+        except Exception as e:
             return {
-                'success': True,
-                'num_beats': len(onset_times),
-                'tempo': 0,
-                'beat_times': onset_times,
-                'onset_env': onset_env
+                'success': False,
+                'error': str(e)
             }
-        
-        # Calculate intervals between all consecutive onsets
-        intervals = np.diff(onset_times)
-        
-        # Find the dominant period using histogram clustering
-        # Most intervals should cluster around the true metronome period
-        hist, bin_edges = np.histogram(intervals, bins=50)
-        dominant_bin = np.argmax(hist)
-        dominant_interval = (bin_edges[dominant_bin] + bin_edges[dominant_bin + 1]) / 2
-        
-        # Calculate expected tempo
-        tempo = 60.0 / dominant_interval if dominant_interval > 0 else 0
-        
-        # Now filter onsets to keep only those that fit the periodic pattern
-        # Start with the first onset
-        filtered_times = [onset_times[0]]
-        expected_next = onset_times[0] + dominant_interval
-        
-        # Tolerance: allow ±15% deviation from expected interval
-        tolerance = dominant_interval * 0.15
-        
-        for onset_time in onset_times[1:]:
-            # Check if this onset is close to where we expect the next beat
-            if abs(onset_time - expected_next) <= tolerance:
-                filtered_times.append(onset_time)
-                expected_next = onset_time + dominant_interval
-            elif onset_time > expected_next + tolerance:
-                # We might have missed a beat, reset expectation
-                expected_next = onset_time + dominant_interval
-                filtered_times.append(onset_time)
-        
-        filtered_times = np.array(filtered_times)
-        
-        # Recalculate tempo from filtered beats
-        if len(filtered_times) > 1:
-            intervals = np.diff(filtered_times)
-            median_interval = np.median(intervals)
-            tempo = 60.0 / median_interval if median_interval > 0 else 0
-        
+    return stage
+
+
+@cache_stage
+def detect_metronome(y, sr):
+    """Detect metronome beeps/ticks and calculate tempo using periodicity"""
+    # Band-pass for mechanical metronome: keep only the STFT bins inside
+    # the click band
+    band = _click_band(sr)
+    
+    # Get onset strength envelope
+    onset_env = _onset_envelope(compute_spectrogram(y, sr) * band[:, None], sr)
+    
+    # Detect ALL potential onsets (lenient detection): peaks of the
+    # normalized envelope at least delta above its ±0.58s moving average,
+    # kept >= 0.3s apart (delta 0.3 keeps out note attacks that leak into
+    # the click band). Windows are given in seconds, converted to
+    # onset frames, so they don't depend on sr/hop_length.
+    frames_per_sec = sr / AUDIO_PARAMS['hop_length']
+    env = onset_env - onset_env.min()
+    if env.max() > 0:
+        env /= env.max()
+    moving_avg = ndimage.uniform_filter1d(
+        env,
+        size=2 * int(round(0.58 * frames_per_sec)) + 1,
+        mode='nearest'
+    )
+    onset_frames, _ = signal.find_peaks(
+        env,
+        height=moving_avg + METRONOME_PARAMS['delta'],
+        distance=max(int(0.3 * frames_per_sec), 1)
+    )
+    
+    # Convert frames to time
+    onset_times = librosa.frames_to_time(
+        onset_frames, 
+        sr=sr, 
+        hop_length=AUDIO_PARAMS['hop_length']
+    )
+    
+    if len(onset_times) < 3:
         return {
             'success': True,
-            'num_beats': len(filtered_times),
-            'tempo': tempo,
-            'beat_times': filtered_times,
-            'onset_env': onset_env,
-            'all_onsets': onset_times  # Keep all onsets for debugging
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
+            'num_beats': len(onset_times),
+            'tempo': 0,
+            'beat_times': onset_times,
+            'onset_env': onset_env
         }
+    
+    # Calculate intervals between all consecutive onsets
+    intervals = np.diff(onset_times)
+    
+    # Find the dominant period - most intervals should cluster around
+    # the true metronome period. A KDE peak avoids histogram bin
+    # quantization; fall back to the histogram for very few intervals.
+    dominant_interval = None
+    if len(intervals) >= 5 and np.ptp(intervals) > 0:
+        try:
+            kde = stats.gaussian_kde(intervals, bw_method=0.15)
+            grid = np.linspace(intervals.min(), intervals.max(), 512)
+            dominant_interval = grid[np.argmax(kde(grid))]
+        except np.linalg.LinAlgError:
+            pass  # Degenerate interval distribution
+    
+    if dominant_interval is None:
+        hist, bin_edges = np.histogram(intervals, bins=50)
+        dominant_bin = np.argmax(hist)
+        dominant_interval = (bin_edges[dominant_bin] + bin_edges[dominant_bin + 1]) / 2
+    
+    # Calculate expected tempo
+    tempo = 60.0 / dominant_interval if dominant_interval > 0 else 0
+    
+    # Now filter onsets to keep only those that fit the periodic pattern
+    # Tolerance: allow ±15% deviation from expected interval
+    tolerance = dominant_interval * 0.15
+    
+    # An onset is kept when it lands on the expected next beat (within
+    # tolerance) or later (missed beat, which resets the expectation) -
+    # i.e. at least (interval - tolerance) after the previously kept one.
+    # Look up each onset's successor at once, then follow the chain.
+    next_idx = np.searchsorted(onset_times, onset_times + dominant_interval - tolerance)
+    kept = [0]
+    while next_idx[kept[-1]] < len(onset_times):
+        kept.append(next_idx[kept[-1]])
+    
+    filtered_times = onset_times[kept]
+    
+    # Recalculate tempo from filtered beats: the slope of a line through
+    # beat time vs beat number (missed beats skip a number) averages out
+    # the one-frame jitter a median of frame-quantized intervals keeps
+    if len(filtered_times) > 1:
+        intervals = np.diff(filtered_times)
+        median_interval = np.median(intervals)
+        if median_interval > 0:
+            beat_number = np.concatenate(
+                ([0], np.cumsum(np.maximum(np.round(intervals / median_interval), 1)))
+            )
+            period = np.polyfit(beat_number, filtered_times, 1)[0]
+            tempo = 60.0 / period
+        else:
+            tempo = 0
+    
+    return {
+        'success': True,
+        'num_beats': len(filtered_times),
+        'tempo': tempo,
+        'beat_times': filtered_times,
+        'onset_env': onset_env,
+        'all_onsets': onset_times  # Keep all onsets for debugging
+    }
 
 
-def extract_pitch(y, sr):
-    """Extract fundamental frequency (f0) over time using YIN algorithm"""
-    try:
-        # Use YIN algorithm for pitch detection
+@cache_stage
+def extract_pitch(y, sr, backend=PITCH_BACKEND):
+    """Extract fundamental frequency (f0) over time (WORLD DIO or YIN, see PITCH_BACKEND)"""
+    if backend == 'pyworld' and HAS_PYWORLD:
+        # DIO estimate refined by StoneMask, 50ms frame period
+        y64 = y.astype(np.float64)
+        f0, times = pyworld.dio(
+            y64,
+            sr,
+            f0_floor=AUDIO_PARAMS['fmin'],  # G3 (196 Hz)
+            f0_ceil=AUDIO_PARAMS['fmax'],   # A6 (1760 Hz)
+            frame_period=50.0
+        )
+        f0 = pyworld.stonemask(y64, f0, times, sr)
+        
+        # pyworld marks unvoiced frames with 0
+        f0[f0 == 0] = np.nan
+    else:
+        # Use YIN algorithm for pitch detection (numba kernel)
         # hop_length from config (50ms resolution)
+        from yin_numba import yin
         hop_length = int(0.05 * sr)  # 50ms
         
-        f0 = librosa.yin(
+        f0 = yin(
             y,
+            sr,
             fmin=AUDIO_PARAMS['fmin'],   # G3 (196 Hz)
             fmax=AUDIO_PARAMS['fmax'],   # A6 (1760 Hz)
-            sr=sr,
             hop_length=hop_length
         )
         
@@ -152,89 +315,82 @@ def extract_pitch(y, sr):
             sr=sr,
             hop_length=hop_length
         )
-        
-        # Handle NaN values (where pitch couldn't be detected)
-        # Forward-fill NaNs for now
-        f0_clean = f0.copy()
-        nan_mask = np.isnan(f0_clean)
-        
-        # Interpolate NaNs
-        if np.any(nan_mask):
-            # Get indices of non-NaN values
-            valid_indices = np.where(~nan_mask)[0]
-            if len(valid_indices) > 0:
-                # Interpolate
-                f0_clean[nan_mask] = np.interp(
-                    np.where(nan_mask)[0],
-                    valid_indices,
-                    f0_clean[valid_indices]
-                )
-        
-        # Count how many frames had NaN
-        nan_count = np.sum(nan_mask)
-        nan_percentage = (nan_count / len(f0)) * 100
-        
-        # Create DataFrame
-        import pandas as pd
-        df = pd.DataFrame({
-            'time_s': times,
-            'f0': f0_clean,
-            'f0_raw': f0  # Keep raw with NaNs for reference
-        })
-        
-        return {
-            'success': True,
-            'df': df,
-            'num_frames': len(f0),
-            'nan_count': nan_count,
-            'nan_percentage': nan_percentage,
-            'frequency_range': (np.nanmin(f0), np.nanmax(f0))
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+    
+    # Count how many frames had NaN (where pitch couldn't be detected)
+    nan_mask = np.isnan(f0)
+    nan_count = np.sum(nan_mask)
+    nan_percentage = (nan_count / len(f0)) * 100
+
+    # Nothing voiced (silence, noise, or below fmin) - no pitch to
+    # interpolate from
+    if nan_count == len(f0):
+        raise ValueError('No pitched sound detected in the recording')
+
+    # Interpolate NaNs in one pass, holding the edge values at both ends
+    # (float32 is plenty for 50ms frames and Hz values)
+    import pandas as pd
+    f0_clean = pd.Series(f0, dtype=np.float32).interpolate(
+        method='linear',
+        limit_direction='both'
+    )
+    
+    # Per-frame columns as plain arrays
+    frames = {
+        'time_s': times.astype(np.float32),
+        'f0': f0_clean.to_numpy()
+    }
+    
+    return {
+        'success': True,
+        'frames': frames,
+        'num_frames': len(f0),
+        'nan_count': nan_count,
+        'nan_percentage': nan_percentage,
+        'frequency_range': (np.nanmin(f0), np.nanmax(f0))
+    }
 
 
-def identify_notes(df):
+def identify_notes(frames):
     """Convert frequencies to note names, MIDI numbers, and cents deviation"""
     try:
-        import pandas as pd
-        
-        # Note names for mapping
-        NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        
         # Convert frequency to MIDI number (continuous)
         # MIDI 69 = A4 = 440 Hz
         # Formula: midi = 69 + 12 * log2(f / 440)
-        df['midi_float'] = 69 + 12 * np.log2(df['f0'] / 440.0)
+        midi_float = (69 + 12 * np.log2(frames['f0'] / 440.0)).astype(np.float32)
+        frames['midi_float'] = midi_float
         
-        # Round to nearest MIDI integer
-        df['midi_rounded'] = df['midi_float'].round().astype(int)
+        # Round to nearest MIDI integer - frames without a usable f0 (NaN or
+        # non-positive) are masked out, since casting NaN to int is undefined,
+        # and the rest clipped to the 128-entry tables
+        valid = np.isfinite(midi_float)
+        midi = np.zeros(len(midi_float), dtype=np.int16)
+        midi[valid] = np.clip(np.round(midi_float[valid]), 0, 127)
+        frames['midi_rounded'] = midi
         
         # Calculate cents deviation from nearest note
         # 100 cents = 1 semitone
-        df['cents_off'] = (df['midi_float'] - df['midi_rounded']) * 100
+        frames['cents_off'] = np.where(valid, (midi_float - midi) * 100, np.nan).astype(np.float32)
         
-        # Map MIDI number to note name
-        df['note_name'] = df['midi_rounded'].apply(
-            lambda midi: NOTE_NAMES[midi % 12] + str(midi // 12 - 1)
-        )
+        # Pitch class + octave (names are looked up from MIDI_NOTE_NAMES)
+        frames['note_name_idx'] = (midi % 12).astype(np.uint8)
+        frames['note_octave'] = (midi // 12 - 1).astype(np.int8)
         
-        # Calculate ideal frequency for the rounded MIDI note
-        df['ideal_freq'] = 440.0 * (2 ** ((df['midi_rounded'] - 69) / 12))
+        # Look up ideal frequency for the rounded MIDI note
+        frames['ideal_freq'] = np.where(valid, IDEAL_FREQ_TABLE[midi], np.nan).astype(IDEAL_FREQ_TABLE.dtype)
         
-        # Get note statistics
-        note_counts = df['note_name'].value_counts().to_dict()
-        unique_notes = df['note_name'].nunique()
+        # Get note statistics (most frequent first), over voiced frames only
+        counts = np.bincount(midi[valid], minlength=128)
+        order = np.argsort(-counts, kind='stable')
+        order = order[counts[order] > 0]
+        note_counts = dict(zip(MIDI_NOTE_NAMES[order].tolist(), counts[order].tolist()))
+        unique_notes = len(order)
         
         # Average cents deviation (absolute)
-        avg_cents_off = df['cents_off'].abs().mean()
+        avg_cents_off = np.abs(frames['cents_off'][valid]).mean() if valid.any() else 0.0
         
         return {
             'success': True,
-            'df': df,
+            'frames': frames,
             'note_counts': note_counts,
             'unique_notes': unique_notes,
             'avg_cents_off': avg_cents_off
@@ -246,100 +402,120 @@ def identify_notes(df):
         }
 
 
-def segment_notes(df, y, sr):
+@cache_stage
+def segment_notes(frames, y, sr):
     """Segment continuous pitch data into discrete note events"""
-    try:
-        import pandas as pd
-        
-        # Detect note onsets using librosa
-        hop_length = int(0.05 * sr)
-        onset_frames = librosa.onset.onset_detect(
-            y=y,
-            sr=sr,
-            hop_length=hop_length,
-            backtrack=False,
-            pre_max=20,
-            post_max=20,
-            pre_avg=100,
-            post_avg=100,
-            delta=0.07,  # Lower threshold to catch more violin onsets
-            wait=int(0.1 * sr / hop_length),  # Min 0.1s between onsets
-            units='frames'
-        )
-        
-        onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop_length)
-        
-        # Add onset markers to DataFrame
-        df['is_onset'] = False
-        for onset_time in onset_times:
-            # Find closest frame to this onset
-            closest_idx = (df['time_s'] - onset_time).abs().idxmin()
-            df.loc[closest_idx, 'is_onset'] = True
-        
-        # Hybrid approach: combine onsets with pitch change detection
-        # Detect significant MIDI changes (> 1 semitone)
-        df['midi_change'] = df['midi_rounded'].diff().abs()
-        df['is_pitch_change'] = df['midi_change'] > 1
-        
-        # Combine: onset OR significant pitch change
-        df['is_note_start'] = df['is_onset'] | df['is_pitch_change']
-        
-        # Segment notes based on note starts
-        notes = []
-        current_note_start = 0
-        
-        for i in range(1, len(df)):
-            if df.loc[i, 'is_note_start']:
-                # End previous note
-                if i > current_note_start:
-                    note_segment = df.loc[current_note_start:i-1]
-                    
-                    if len(note_segment) > 0:
-                        notes.append({
-                            'start_time': note_segment['time_s'].iloc[0],
-                            'end_time': note_segment['time_s'].iloc[-1],
-                            'duration': note_segment['time_s'].iloc[-1] - note_segment['time_s'].iloc[0],
-                            'note_name': note_segment['note_name'].mode()[0] if len(note_segment['note_name'].mode()) > 0 else note_segment['note_name'].iloc[0],
-                            'midi_number': int(note_segment['midi_rounded'].median()),
-                            'avg_frequency': note_segment['f0'].mean(),
-                            'ideal_frequency': note_segment['ideal_freq'].mean(),
-                            'avg_cents_off': note_segment['cents_off'].mean(),
-                            'abs_avg_cents_off': note_segment['cents_off'].abs().mean()
-                        })
-                
-                current_note_start = i
-        
-        # Add final note
-        if current_note_start < len(df):
-            note_segment = df.loc[current_note_start:]
-            if len(note_segment) > 0:
-                notes.append({
-                    'start_time': note_segment['time_s'].iloc[0],
-                    'end_time': note_segment['time_s'].iloc[-1],
-                    'duration': note_segment['time_s'].iloc[-1] - note_segment['time_s'].iloc[0],
-                    'note_name': note_segment['note_name'].mode()[0] if len(note_segment['note_name'].mode()) > 0 else note_segment['note_name'].iloc[0],
-                    'midi_number': int(note_segment['midi_rounded'].median()),
-                    'avg_frequency': note_segment['f0'].mean(),
-                    'ideal_frequency': note_segment['ideal_freq'].mean(),
-                    'avg_cents_off': note_segment['cents_off'].mean(),
-                    'abs_avg_cents_off': note_segment['cents_off'].abs().mean()
-                })
-        
-        notes_df = pd.DataFrame(notes)
-        
-        return {
-            'success': True,
-            'df': df,  # Return updated DataFrame with onset markers
-            'notes': notes_df,
-            'num_notes': len(notes_df),
-            'num_onsets': len(onset_times),
-            'onset_times': onset_times
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+    import pandas as pd
+    
+    # Detect note onsets
+    # Peak-picking windows are given in seconds, converted to STFT frames
+    hop_length = AUDIO_PARAMS['hop_length']
+    frames_per_sec = sr / hop_length
+    onset_env = _onset_envelope(compute_spectrogram(y, sr), sr)
+    onset_frames = librosa.onset.onset_detect(
+        onset_envelope=onset_env,
+        sr=sr,
+        hop_length=hop_length,
+        backtrack=False,
+        pre_max=int(1.0 * frames_per_sec),
+        post_max=int(1.0 * frames_per_sec),
+        pre_avg=int(5.0 * frames_per_sec),
+        post_avg=int(5.0 * frames_per_sec),
+        delta=0.07,  # Lower threshold to catch more violin onsets
+        wait=int(0.1 * frames_per_sec),  # Min 0.1s between onsets
+        units='frames'
+    )
+    
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop_length)
+    
+    # Add onset markers to the frames
+    # Frame times are sorted, so the closest frame to each onset is one
+    # of its two searchsorted neighbours (ties go to the earlier frame)
+    times = frames['time_s']
+    is_onset = np.zeros(len(times), dtype=bool)
+    if len(times) > 1 and len(onset_times) > 0:
+        idx = np.clip(np.searchsorted(times, onset_times), 1, len(times) - 1)
+        left = times[idx - 1]
+        right = times[idx]
+        nearest = np.where(onset_times - left <= right - onset_times, idx - 1, idx)
+        is_onset[nearest] = True
+    elif len(times) == 1 and len(onset_times) > 0:
+        is_onset[0] = True
+    frames['is_onset'] = is_onset
+    
+    # Hybrid approach: combine onsets with pitch change detection
+    # Detect significant MIDI changes (> 1 semitone)
+    midi = frames['midi_rounded']
+    midi_change = np.abs(np.diff(midi.astype(np.int32), prepend=midi[:1]))
+    frames['is_pitch_change'] = midi_change > 1
+    
+    # Combine: onset OR significant pitch change
+    frames['is_note_start'] = is_onset | frames['is_pitch_change']
+    
+    # Segment notes based on note starts - each start opens a new segment.
+    # Segments are contiguous runs of frames, so per-segment sums are
+    # np.add.reduceat over the segment start indices
+    segment_id = np.cumsum(frames['is_note_start'])
+    segment_id -= segment_id[0]
+    first = np.flatnonzero(np.diff(segment_id, prepend=-1))
+    last = np.append(first[1:] - 1, len(segment_id) - 1)
+    counts = last - first + 1
+    
+    def segment_mean(values):
+        return (np.add.reduceat(values.astype(np.float64), first) / counts).astype(np.float32)
+    
+    # Per-segment histogram of MIDI numbers over the played range
+    midi_min = int(midi.min())
+    note_hist = np.zeros((len(first), int(midi.max()) - midi_min + 1), dtype=np.int32)
+    np.add.at(note_hist, (segment_id, midi - midi_min), 1)
+    
+    # Median MIDI number: the middle value(s) read off the cumulative
+    # histogram, no per-segment sort
+    cumulative = np.cumsum(note_hist, axis=1)
+    lower = np.argmax(cumulative > ((counts - 1) // 2)[:, None], axis=1)
+    upper = np.argmax(cumulative > (counts // 2)[:, None], axis=1)
+    midi_median = (lower + upper) / 2 + midi_min
+    
+    # Most common note name per segment (ties go to the first name
+    # alphabetically)
+    names = MIDI_NOTE_NAMES[midi_min:midi_min + note_hist.shape[1]]
+    name_order = np.argsort(names, kind='stable')
+    note_name = names[name_order[np.argmax(note_hist[:, name_order], axis=1)]]
+    
+    # Note events go out as a DataFrame (visualization/export boundary)
+    start_time = times[first]
+    end_time = times[last]
+    notes_df = pd.DataFrame({
+        'start_time': start_time,
+        'end_time': end_time,
+        'duration': end_time - start_time,
+        'note_name': note_name,
+        'midi_number': midi_median.astype(int),
+        'avg_frequency': segment_mean(frames['f0']),
+        'ideal_frequency': segment_mean(frames['ideal_freq']),
+        'avg_cents_off': segment_mean(frames['cents_off']),
+        'abs_avg_cents_off': segment_mean(np.abs(frames['cents_off']))
+    })
+    
+    return {
+        'success': True,
+        'frames': frames,  # Return updated frames with onset markers
+        'notes': notes_df,
+        'num_notes': len(notes_df),
+        'num_onsets': len(onset_times),
+        'onset_times': onset_times
+    }
+
+
+def warmup():
+    """Run the DSP stages once on a one-second A4 tone (imports, JIT compile)"""
+    t = np.arange(TARGET_SR) / TARGET_SR
+    y = (0.1 * np.sin(2 * np.pi * 440.0 * t)).astype(np.float32)
+    
+    # The undecorated stages - the same tone every start would otherwise be
+    # a disk-cache hit that runs none of the code being warmed up
+    getattr(detect_metronome, '__wrapped__', detect_metronome)(y, TARGET_SR)
+    getattr(extract_pitch, '__wrapped__', extract_pitch)(y, TARGET_SR)
 
 
 def calculate_timing_accuracy(notes_df, beat_times):
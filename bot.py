@@ -1,4 +1,5 @@
 """Practice Buddy Bot - Main entry point"""
+import os
 import sys
 import logging
 from telegram.ext import (
@@ -10,7 +11,13 @@ from telegram.ext import (
     filters
 )
 
-from config import BOT_TOKEN, VERSION, VOICE_FOLDER
+from config import BOT_TOKEN, VERSION, VOICE_FOLDER, LIBROSA_CACHE_PARAMS
+
+# Enable librosa's disk cache - must happen before anything imports librosa
+os.environ.setdefault('LIBROSA_CACHE_DIR', LIBROSA_CACHE_PARAMS['dir'])
+os.environ.setdefault('LIBROSA_CACHE_LEVEL', str(LIBROSA_CACHE_PARAMS['level']))
+os.environ.setdefault('LIBROSA_CACHE_MMAP', LIBROSA_CACHE_PARAMS['mmap'])
+
 from handlers.conversation import (
     State,
     start_command,
@@ -21,7 +28,7 @@ from handlers.conversation import (
     receive_audio,
     invalid_input
 )
-from handlers.analysis import handle_voice
+from handlers.analysis import handle_voice, warm_pools
 
 # Configure logging
 logging.basicConfig(
@@ -66,20 +73,38 @@ def setup_handlers(app: Application):
     logger.info("✓ Handlers registered")
 
 
+def build_application():
+    """Create the application with all handlers registered"""
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .read_timeout(30)
+        .write_timeout(60)
+        # Handle updates concurrently - otherwise PTB awaits each handler in
+        # turn and a second user's voice message waits for the first report.
+        # ANALYSIS_SLOTS bounds how many pipelines actually run at once.
+        .concurrent_updates(True)
+        .build()
+    )
+    
+    # Setup handlers
+    setup_handlers(app)
+    return app
+
+
 def main():
     """Start the bot"""
-    import os
-    
     # Create voice_messages folder
     os.makedirs(VOICE_FOLDER, exist_ok=True)
     
     logger.info(f"Starting Practice Buddy Bot v{VERSION}...")
     
     # Create application
-    app = Application.builder().token(BOT_TOKEN).read_timeout(30).write_timeout(60).build()
+    app = build_application()
     
-    # Setup handlers
-    setup_handlers(app)
+    # Import librosa/matplotlib and JIT-compile in the workers now, not on
+    # the first voice message
+    warm_pools()
     
     logger.info(f"🤖 Practice Buddy Bot v{VERSION} is running!")
     print(f"🤖 Practice Buddy Bot v{VERSION} is running!", flush=True)
@@ -14,16 +14,51 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 # Folder settings
 VOICE_FOLDER = "voice_messages"
 
-# Audio processing parameters
+# Keep recordings (and their plots/video) in VOICE_FOLDER after the report is
+# sent. Off by default - recordings are spooled to temp files and deleted.
+ARCHIVE_VOICES = os.getenv("ARCHIVE_VOICES") == "1"
+
+# Worker processes for the analysis stages (default: one per core) and for
+# plot/video rendering
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS") or os.cpu_count() or 1)
+VIZ_WORKERS = int(os.getenv("VIZ_WORKERS") or 2)
+
+# librosa disk cache (joblib.Memory) - exported as LIBROSA_CACHE_* env vars
+# by bot.py before librosa is imported. Level 10 caches librosa's filter
+# banks and the pipeline stages in audio_processing, whose results (onsets,
+# pitch track, notes) stay on disk until the cache is trimmed. librosa's own
+# level-20+ functions (stft, resample, ...) are not cached: their results
+# are the recording itself, or can be inverted back to it.
+LIBROSA_CACHE_PARAMS = {
+    'dir': os.path.join(VOICE_FOLDER, ".librosa_cache"),
+    'level': 10,
+    'mmap': 'r',  # Memory-map cached arrays instead of reading them back
+    'max_size_mb': 500,  # Cache is cleared once it grows beyond this
+}
+
+# Voice messages are resampled to this rate at load time. 16 kHz keeps
+# everything below 8 kHz - well above fmax and the metronome click band.
+TARGET_SR = 16000
+
+# Audio processing parameters - STFT sizes are for TARGET_SR: 1024/256
+# samples at 16 kHz is a 64 ms window every 16 ms, close to the 46/12 ms
+# 2048/512 gave at 44.1 kHz. Scale them together if TARGET_SR changes.
 AUDIO_PARAMS = {
-    'hop_length': 512,
+    'n_fft': 1024,
+    'hop_length': 256,
     'fmin': 196,  # G3
     'fmax': 1760,  # A6
 }
 
+# Pitch tracking backend: 'pyworld' (DIO + StoneMask; uses 'yin' when pyworld
+# isn't installed) or 'yin' (numba)
+PITCH_BACKEND = 'pyworld'
+
 # Metronome detection parameters
 METRONOME_PARAMS = {
     'highpass_freq': 2000,  # Hz
+    'band_low': 800,  # Hz - click band used by the detector
+    'band_high': 4000,  # Hz
     'pre_max': 20,
     'post_max': 20,
     'pre_avg': 100,
@@ -32,9 +67,15 @@ METRONOME_PARAMS = {
     'min_interval': 0.4,  # seconds (150 BPM max)
 }
 
+# Recordings shorter than this (seconds) get no video report - the pitch
+# analysis image already shows the whole take
+MIN_VIDEO_DURATION = 15
+
 # Visualization settings
 VIZ_PARAMS = {
     'figure_width': 14,
     'figure_height': 8,
     'dpi': 150,
+    'max_figure_width': 28,  # long recordings get wider plots, up to this
+    'png_compress_level': 1,  # zlib level for saved plots - fast, slightly larger files
 }
\ No newline at end of file
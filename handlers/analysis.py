@@ -1,19 +1,28 @@
 """Analysis handler - processes voice messages and generates reports"""
 import os
+import asyncio
 import logging
-from datetime import datetime
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
 
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
-from config import VOICE_FOLDER
+from config import VOICE_FOLDER, ARCHIVE_VOICES, ANALYSIS_WORKERS, VIZ_WORKERS, MIN_VIDEO_DURATION
+import audio_processing
+import visualization
 from audio_processing import (
     load_audio, 
     detect_metronome, 
     extract_pitch, 
     identify_notes, 
     segment_notes, 
-    calculate_timing_accuracy
+    calculate_timing_accuracy,
+    trim_librosa_cache
 )
 from visualization import visualize_metronome_detection, visualize_pitch_and_notes
 from video_generation import generate_video_report
@@ -21,6 +30,112 @@ import messages as msg
 
 logger = logging.getLogger(__name__)
 
+def _new_pool(workers):
+    """A worker process pool - 'spawn' avoids forking the bot's threads"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+# Worker processes for the pipeline stages - sidesteps the GIL so concurrent
+# users are analysed in parallel
+ANALYSIS_POOL = _new_pool(ANALYSIS_WORKERS)
+
+# Separate workers for plot and video rendering, so they never occupy the
+# analysis workers another user's DSP is waiting for
+VIZ_POOL = _new_pool(VIZ_WORKERS)
+
+
+# Voice messages beyond this many wait their turn before downloading, instead
+# of each holding a full pipeline (audio, spectrogram, frames, video) in
+# memory at once
+ANALYSIS_SLOTS = asyncio.Semaphore(ANALYSIS_WORKERS)
+
+
+def warm_pools():
+    """Start the worker processes and warm them up in the background"""
+    for _ in range(ANALYSIS_WORKERS):
+        ANALYSIS_POOL.submit(audio_processing.warmup)
+    for _ in range(VIZ_WORKERS):
+        VIZ_POOL.submit(visualization.warmup)
+
+
+def _replace_broken(pool, workers):
+    """A fresh pool for one whose worker died (OOM kill, crash in native
+    code) - a broken ProcessPoolExecutor fails every later submit"""
+    logger.error("Worker process died, restarting the pool")
+    pool.shutdown(wait=False, cancel_futures=True)
+    return _new_pool(workers)
+
+
+async def run_blocking(func, *args):
+    """Run a blocking pipeline stage in a worker process, off the event loop.
+    The stages are pure, so one that lost its worker is retried once on a
+    new pool; a second crash fails the analysis."""
+    global ANALYSIS_POOL
+    loop = asyncio.get_running_loop()
+    pool = ANALYSIS_POOL
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        if ANALYSIS_POOL is pool:  # Not already replaced by another task
+            ANALYSIS_POOL = _replace_broken(pool, ANALYSIS_WORKERS)
+        return await loop.run_in_executor(ANALYSIS_POOL, func, *args)
+
+
+async def run_render(func, *args):
+    """Run a plot/video rendering stage in a rendering worker process,
+    retried once on a new pool like run_blocking"""
+    global VIZ_POOL
+    loop = asyncio.get_running_loop()
+    pool = VIZ_POOL
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        if VIZ_POOL is pool:
+            VIZ_POOL = _replace_broken(pool, VIZ_WORKERS)
+        return await loop.run_in_executor(VIZ_POOL, func, *args)
+
+
+async def run_light(func, *args):
+    """Run a cheap stage in a thread - not worth pickling its inputs to a worker"""
+    return await asyncio.to_thread(func, *args)
+
+
+def save_file(filepath, data):
+    """Write a downloaded voice message or a rendered plot to disk"""
+    with open(filepath, 'wb') as f:
+        f.write(data)
+
+
+async def send_plot(update: Update, viz_result, caption):
+    """Send a rendered plot straight from memory, archiving a copy if enabled"""
+    await update.message.reply_photo(photo=viz_result['plot_png'], caption=caption)
+    if ARCHIVE_VOICES:
+        await asyncio.to_thread(save_file, viz_result['plot_path'], viz_result['plot_png'])
+
+
+async def set_status(status, text):
+    """Edit the status message - a failed edit (rate limit, message deleted,
+    unchanged text) must not abort the analysis"""
+    try:
+        await status.edit_text(text)
+    except TelegramError as e:
+        logger.warning(f"Status update failed: {e}")
+
+
+def cleanup_voice_files(filepath):
+    """Delete the video rendered from a recording (the recording and plots
+    are only written to disk when archiving)"""
+    outputs = ['_report.mp4']
+    base = os.path.splitext(filepath)[0]
+    for path in [base + suffix for suffix in outputs]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming voice messages - main entry point"""
@@ -35,218 +150,274 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     voice = update.message.voice
     
-    # Download voice file
-    file = await context.bot.get_file(voice.file_id)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"voice_{timestamp}.ogg"
+    # Names the archive copy and everything rendered from the recording;
+    # nothing is written under it unless archiving or rendering the video
+    filename = f"voice_{uuid.uuid4().hex[:8]}.ogg"
     filepath = os.path.join(VOICE_FOLDER, filename)
     
-    logger.info(f"Downloading to {filepath}...")
-    await file.download_to_drive(filepath)
-    logger.info(f"✓ Downloaded: {filename}")
-    
-    await update.message.reply_text(msg.FILE_RECEIVED)
-    
-    # Run analysis pipeline
+    saved = None
+    status = None
+    final_status = msg.STATUS_FAILED
     try:
-        await analyze_audio(update, filepath, instrument, piece_name)
+        # Single status message, edited in place as the pipeline progresses -
+        # sent right away, so a queued message is acknowledged too
+        status = await update.message.reply_text(msg.FILE_RECEIVED)
+        
+        async with ANALYSIS_SLOTS:
+            # Download into memory - the pipeline decodes straight from the
+            # buffer. Inside the try, so a failed download still cleans up.
+            logger.info(f"Downloading {filename}...")
+            file = await context.bot.get_file(voice.file_id)
+            audio = BytesIO()
+            await file.download_to_memory(audio)
+            audio.seek(0)
+            logger.info(f"✓ Downloaded: {filename}")
+            
+            # Archive copy, written while the analysis runs - straight from the
+            # download buffer, without copying it. Nothing else reads the file.
+            if ARCHIVE_VOICES:
+                saved = asyncio.create_task(asyncio.to_thread(save_file, filepath, audio.getbuffer()))
+            
+            # Run analysis pipeline
+            try:
+                final_status = await analyze_audio(update, status, audio, filepath, instrument, piece_name)
+            finally:
+                if saved is not None:
+                    await saved
     except Exception as e:
         logger.error(f"Analysis failed: {e}", exc_info=True)
         await update.message.reply_text(f"❌ {msg.ERROR_ANALYSIS_FAILED}")
     finally:
+        # Leave the status message on how it ended, not on a progress step
+        if status is not None:
+            await set_status(status, final_status)
         # Clear conversation context
         context.user_data.clear()
+        if not ARCHIVE_VOICES:
+            await asyncio.to_thread(cleanup_voice_files, filepath)
+        # Keep librosa's disk cache bounded
+        await asyncio.to_thread(trim_librosa_cache)
 
 
-async def analyze_audio(update: Update, filepath: str, instrument: str, piece_name: str):
-    """Run the full analysis pipeline"""
+async def analyze_audio(update: Update, status, audio, filepath: str, instrument: str, piece_name: str):
+    """Run the full analysis pipeline on `audio` (path or file-like) and
+    return the final status text"""
     
     # Step 1: Load audio
     logger.info("Step 1: Loading audio...")
-    await update.message.reply_text(msg.ANALYZING_AUDIO)
-    result = load_audio(filepath)
+    await set_status(status, msg.ANALYZING_AUDIO)
+    result = await run_blocking(load_audio, audio)
     
     if not result['success']:
         logger.error(f"Audio load failed: {result['error']}")
         await update.message.reply_text(f"❌ {msg.ERROR_ANALYSIS_FAILED}\n{result['error']}")
-        return
+        return msg.STATUS_FAILED
     
     logger.info(f"✓ Audio loaded: {result['duration']:.2f}s @ {result['sample_rate']}Hz")
     
-    message = (
+    # Per-stage results, sent together as one message once timing is done
+    summary = []
+    
+    summary.append(
         f"📊 تحلیل صوتی\n"
         f"مدت: {result['duration']:.2f} ثانیه\n"
         f"نرخ نمونه‌برداری: {result['sample_rate']} Hz\n"
         f"✅ فایل صوتی بارگذاری شد"
     )
-    await update.message.reply_text(message)
     
     # Step 2: Detect metronome
     logger.info("Step 2: Detecting metronome...")
-    await update.message.reply_text(msg.DETECTING_METRONOME)
-    metronome_result = detect_metronome(result['y'], result['sr'])
+    await set_status(status, msg.DETECTING_METRONOME)
+    metronome_result = await run_blocking(detect_metronome, result['y'], result['sr'])
     
     if not metronome_result['success']:
         logger.error(f"Metronome detection failed: {metronome_result['error']}")
-        await update.message.reply_text(f"❌ خطا در تشخیص مترونوم: {metronome_result['error']}")
-        return
+        summary.append(f"❌ خطا در تشخیص مترونوم: {metronome_result['error']}")
+        await update.message.reply_text("\n\n".join(summary))
+        return msg.STATUS_FAILED
     
     logger.info(f"✓ Metronome: {metronome_result['num_beats']} beats @ {metronome_result['tempo']:.1f} BPM")
     
-    message = (
+    summary.append(
         f"🎼 تشخیص مترونوم:\n"
         f"تعداد ضربات: {metronome_result['num_beats']}\n"
         f"تمپو: {metronome_result['tempo']:.1f} BPM\n"
         f"✅ تحلیل مترونوم کامل شد"
     )
-    await update.message.reply_text(message)
     
-    # Create metronome visualization
-    viz_metro_result = visualize_metronome_detection(
-        result['y'], result['sr'], metronome_result['beat_times'], filepath
-    )
+    # Create metronome visualization - rendered in a rendering worker while
+    # the analysis workers carry on with pitch and notes
+    metronome_plot = asyncio.create_task(run_render(
+        visualize_metronome_detection,
+        result['y'], result['sr'], metronome_result['beat_times'],
+        metronome_result['onset_env'], filepath
+    ))
     
-    if viz_metro_result['success']:
-        with open(viz_metro_result['plot_path'], 'rb') as photo:
-            await update.message.reply_photo(photo=photo, caption="شکل موج با ضربات مترونوم")
-        logger.info("✓ Metronome visualization sent")
-    
-    # Step 3: Extract pitch
-    logger.info("Step 3: Extracting pitch...")
-    await update.message.reply_text(msg.EXTRACTING_PITCH)
-    pitch_result = extract_pitch(result['y'], result['sr'])
-    
-    if not pitch_result['success']:
-        logger.error(f"Pitch extraction failed: {pitch_result['error']}")
-        await update.message.reply_text(f"❌ خطا در استخراج نت‌ها: {pitch_result['error']}")
-        return
-    
-    freq_min, freq_max = pitch_result['frequency_range']
-    logger.info(f"✓ Pitch extracted: {pitch_result['num_frames']} frames, {freq_min:.1f}-{freq_max:.1f} Hz")
-    
-    message = (
-        f"🎵 تحلیل نت‌ها:\n"
-        f"تعداد فریم: {pitch_result['num_frames']}\n"
-        f"محدوده فرکانس: {freq_min:.1f} - {freq_max:.1f} Hz\n"
-        f"✅ استخراج نت‌ها کامل شد"
-    )
-    await update.message.reply_text(message)
-    
-    # Step 4: Identify notes
-    logger.info("Step 4: Identifying notes...")
-    await update.message.reply_text(msg.IDENTIFYING_NOTES)
-    note_result = identify_notes(pitch_result['df'])
-    
-    if not note_result['success']:
-        logger.error(f"Note identification failed: {note_result['error']}")
-        await update.message.reply_text(f"❌ خطا در شناسایی نت‌ها: {note_result['error']}")
-        return
+    # send_summary awaits the plot on every normal exit - if a later stage
+    # raises, cancel the render instead of leaving it running unawaited
+    try:
+        async def send_summary():
+            """Send the metronome plot, then the per-stage results"""
+            viz_metro_result = await metronome_plot
+            if viz_metro_result['success']:
+                await send_plot(update, viz_metro_result, "شکل موج با ضربات مترونوم")
+                logger.info("✓ Metronome visualization sent")
+            await update.message.reply_text("\n\n".join(summary))
+    
+        # Step 3: Extract pitch
+        logger.info("Step 3: Extracting pitch...")
+        await set_status(status, msg.EXTRACTING_PITCH)
+        pitch_result = await run_blocking(extract_pitch, result['y'], result['sr'])
+    
+        if not pitch_result['success']:
+            logger.error(f"Pitch extraction failed: {pitch_result['error']}")
+            summary.append(f"❌ خطا در استخراج نت‌ها: {pitch_result['error']}")
+            await send_summary()
+            return msg.STATUS_FAILED
+    
+        freq_min, freq_max = pitch_result['frequency_range']
+        logger.info(f"✓ Pitch extracted: {pitch_result['num_frames']} frames, {freq_min:.1f}-{freq_max:.1f} Hz")
+    
+        summary.append(
+            f"🎵 تحلیل نت‌ها:\n"
+            f"تعداد فریم: {pitch_result['num_frames']}\n"
+            f"محدوده فرکانس: {freq_min:.1f} - {freq_max:.1f} Hz\n"
+            f"✅ استخراج نت‌ها کامل شد"
+        )
     
-    logger.info(f"✓ Notes identified: {note_result['unique_notes']} unique, avg {note_result['avg_cents_off']:.1f} cents")
+        # Step 4: Identify notes
+        logger.info("Step 4: Identifying notes...")
+        await set_status(status, msg.IDENTIFYING_NOTES)
+        note_result = await run_light(identify_notes, pitch_result['frames'])
     
-    top_notes = sorted(note_result['note_counts'].items(), key=lambda x: x[1], reverse=True)[:5]
-    top_notes_str = "، ".join([f"{note} ({count})" for note, count in top_notes])
+        if not note_result['success']:
+            logger.error(f"Note identification failed: {note_result['error']}")
+            summary.append(f"❌ خطا در شناسایی نت‌ها: {note_result['error']}")
+            await send_summary()
+            return msg.STATUS_FAILED
     
-    message = (
-        f"🎹 شناسایی نت‌ها:\n"
-        f"تعداد نت‌های مختلف: {note_result['unique_notes']}\n"
-        f"نت‌های پرتکرار: {top_notes_str}\n"
-        f"میانگین انحراف کوک: {note_result['avg_cents_off']:.1f} سنت\n"
-        f"✅ شناسایی نت‌ها کامل شد"
-    )
-    await update.message.reply_text(message)
+        logger.info(f"✓ Notes identified: {note_result['unique_notes']} unique, avg {note_result['avg_cents_off']:.1f} cents")
     
-    # Step 5: Segment notes
-    logger.info("Step 5: Segmenting notes...")
-    await update.message.reply_text(msg.SEGMENTING_NOTES)
-    segment_result = segment_notes(note_result['df'], result['y'], result['sr'])
+        top_notes = sorted(note_result['note_counts'].items(), key=lambda x: x[1], reverse=True)[:5]
+        top_notes_str = "، ".join([f"{note} ({count})" for note, count in top_notes])
     
-    if not segment_result['success']:
-        logger.error(f"Segmentation failed: {segment_result['error']}")
-        await update.message.reply_text(f"❌ خطا در تقسیم‌بندی: {segment_result['error']}")
-        return
+        summary.append(
+            f"🎹 شناسایی نت‌ها:\n"
+            f"تعداد نت‌های مختلف: {note_result['unique_notes']}\n"
+            f"نت‌های پرتکرار: {top_notes_str}\n"
+            f"میانگین انحراف کوک: {note_result['avg_cents_off']:.1f} سنت\n"
+            f"✅ شناسایی نت‌ها کامل شد"
+        )
     
-    logger.info(f"✓ Segmented: {segment_result['num_notes']} notes from {segment_result['num_onsets']} onsets")
+        # Step 5: Segment notes
+        logger.info("Step 5: Segmenting notes...")
+        await set_status(status, msg.SEGMENTING_NOTES)
+        segment_result = await run_blocking(segment_notes, note_result['frames'], result['y'], result['sr'])
     
-    message = (
-        f"🎵 تقسیم‌بندی نت‌ها:\n"
-        f"تعداد شروع نت: {segment_result['num_onsets']}\n"
-        f"تعداد نت‌های مجزا: {segment_result['num_notes']}\n"
-        f"✅ تقسیم‌بندی کامل شد"
-    )
-    await update.message.reply_text(message)
+        if not segment_result['success']:
+            logger.error(f"Segmentation failed: {segment_result['error']}")
+            summary.append(f"❌ خطا در تقسیم‌بندی: {segment_result['error']}")
+            await send_summary()
+            return msg.STATUS_FAILED
     
-    # Step 6: Timing accuracy
-    logger.info("Step 6: Analyzing timing...")
-    await update.message.reply_text(msg.ANALYZING_TIMING)
-    timing_result = calculate_timing_accuracy(segment_result['notes'], metronome_result['beat_times'])
+        logger.info(f"✓ Segmented: {segment_result['num_notes']} notes from {segment_result['num_onsets']} onsets")
     
-    if timing_result['success']:
-        logger.info(f"✓ Timing: {timing_result['avg_timing_error']:.1f}ms error, {timing_result['on_beat_percentage']:.1f}% on beat")
-        
-        message = (
-            f"⏱️ تحلیل تایمینگ:\n"
-            f"میانگین خطای تایمینگ: {timing_result['avg_timing_error']:.1f} میلی‌ثانیه\n"
-            f"نت‌های روی ضرب: {timing_result['on_beat_percentage']:.1f}%\n"
-            f"✅ تحلیل تایمینگ کامل شد"
+        summary.append(
+            f"🎵 تقسیم‌بندی نت‌ها:\n"
+            f"تعداد شروع نت: {segment_result['num_onsets']}\n"
+            f"تعداد نت‌های مجزا: {segment_result['num_notes']}\n"
+            f"✅ تقسیم‌بندی کامل شد"
         )
-        await update.message.reply_text(message)
-    
-    # Step 7: Generate visualization
-    logger.info("Step 7: Generating visualization...")
-    await update.message.reply_text(msg.GENERATING_VISUALIZATION)
-    viz_result = visualize_pitch_and_notes(
-        segment_result['df'],
-        timing_result['notes_with_timing'] if timing_result['success'] else segment_result['notes'],
-        metronome_result['beat_times'],
-        filepath
-    )
     
-    if viz_result['success']:
-        with open(viz_result['plot_path'], 'rb') as photo:
-            await update.message.reply_photo(photo=photo, caption=f"گزارش تحلیل کامل - {piece_name}")
-        logger.info("✓ Pitch visualization sent")
-    
-    # Step 8: Generate video
-    logger.info("Step 8: Generating video...")
-    await update.message.reply_text(msg.GENERATING_VIDEO)
-    video_output = filepath.replace('.ogg', '_report.mp4')
-    
-    video_result = generate_video_report(
-        segment_result['df'],
-        segment_result['notes'],
-        metronome_result['beat_times'],
-        filepath,
-        video_output
-    )
+        # Step 6: Timing accuracy
+        logger.info("Step 6: Analyzing timing...")
+        await set_status(status, msg.ANALYZING_TIMING)
+        timing_result = await run_light(
+            calculate_timing_accuracy, segment_result['notes'], metronome_result['beat_times']
+        )
     
-    if not video_result['success']:
-        logger.error(f"Video generation failed: {video_result['error']}")
-        await update.message.reply_text(f"❌ خطا در ساخت ویدیو: {video_result['error']}")
-        return
+        if timing_result['success']:
+            logger.info(f"✓ Timing: {timing_result['avg_timing_error']:.1f}ms error, {timing_result['on_beat_percentage']:.1f}% on beat")
+        
+            summary.append(
+                f"⏱️ تحلیل تایمینگ:\n"
+                f"میانگین خطای تایمینگ: {timing_result['avg_timing_error']:.1f} میلی‌ثانیه\n"
+                f"نت‌های روی ضرب: {timing_result['on_beat_percentage']:.1f}%\n"
+                f"✅ تحلیل تایمینگ کامل شد"
+            )
     
-    # Step 9: Upload video
-    logger.info("Step 9: Uploading video...")
-    await update.message.reply_text(msg.UPLOADING_VIDEO)
+        await send_summary()
+    
+        # Step 7: Generate visualization
+        logger.info("Step 7: Generating visualization...")
+        await set_status(status, msg.GENERATING_VISUALIZATION)
+        viz_result = await run_render(
+            visualize_pitch_and_notes,
+            segment_result['frames'],  # Plain arrays - no DataFrame to build and pickle
+            timing_result['notes_with_timing'] if timing_result['success'] else segment_result['notes'],
+            metronome_result['beat_times'],
+            filepath
+        )
     
-    file_size_mb = os.path.getsize(video_result['video_path']) / (1024 * 1024)
-    logger.info(f"Video size: {file_size_mb:.2f} MB")
+        if viz_result['success']:
+            await send_plot(update, viz_result, f"گزارش تحلیل کامل - {piece_name}")
+            logger.info("✓ Pitch visualization sent")
+    
+        # Short takes: the pitch image above already shows everything
+        if result['duration'] < MIN_VIDEO_DURATION:
+            logger.info(f"Skipping video for {result['duration']:.1f}s recording")
+            logger.info("=== ANALYSIS COMPLETE ===")
+            return msg.VIDEO_SKIPPED_SHORT
+    
+        # Step 8: Generate video
+        logger.info("Step 8: Generating video...")
+        await set_status(status, msg.GENERATING_VIDEO)
+        video_output = os.path.splitext(filepath)[0] + '_report.mp4'
+    
+        video_result = await run_render(
+            generate_video_report,
+            segment_result['frames'],  # Plain arrays - all the renderer reads
+            segment_result['notes'],
+            metronome_result['beat_times'],
+            filepath,
+            video_output,
+            result['duration'],
+            audio.getvalue()  # Audio track straight from the download
+        )
     
-    try:
-        with open(video_result['video_path'], 'rb') as video:
-            await update.message.reply_video(
-                video=video,
-                caption=f"🎻 گزارش ویدیویی تمرین\n🎼 قطعه: {piece_name}\n⏱️ مدت: {video_result['duration']:.1f}s",
-                supports_streaming=True,
-                read_timeout=60,
-                write_timeout=120
+        if not video_result['success']:
+            logger.error(f"Video generation failed: {video_result['error']}")
+            await update.message.reply_text(f"❌ خطا در ساخت ویدیو: {video_result['error']}")
+            return msg.STATUS_FAILED
+    
+        # Step 9: Upload video
+        logger.info("Step 9: Uploading video...")
+        await set_status(status, msg.UPLOADING_VIDEO)
+    
+        file_size_mb = os.path.getsize(video_result['video_path']) / (1024 * 1024)
+        logger.info(f"Video size: {file_size_mb:.2f} MB")
+    
+        try:
+            with open(video_result['video_path'], 'rb') as video:
+                await update.message.reply_video(
+                    video=video,
+                    caption=f"🎻 گزارش ویدیویی تمرین\n🎼 قطعه: {piece_name}\n⏱️ مدت: {video_result['duration']:.1f}s",
+                    supports_streaming=True,
+                    read_timeout=60,
+                    write_timeout=120
+                )
+            logger.info("✓ Video uploaded successfully")
+        except Exception as upload_error:
+            logger.error(f"Video upload failed: {upload_error}")
+            await update.message.reply_text(
+                f"⚠️ ویدیو ساخته شد ولی آپلود ناموفق بود.\n"
+                f"حجم فایل: {file_size_mb:.1f}MB"
             )
-        logger.info("✓ Video uploaded successfully")
-    except Exception as upload_error:
-        logger.error(f"Video upload failed: {upload_error}")
-        await update.message.reply_text(
-            f"⚠️ ویدیو ساخته شد ولی آپلود ناموفق بود.\n"
-            f"حجم فایل: {file_size_mb:.1f}MB"
-        )
+            return msg.STATUS_FAILED
     
-    logger.info("=== ANALYSIS COMPLETE ===")
\ No newline at end of file
+        logger.info("=== ANALYSIS COMPLETE ===")
+        return msg.ANALYSIS_DONE
+    finally:
+        if not metronome_plot.done():
+            metronome_plot.cancel()
+        await asyncio.gather(metronome_plot, return_exceptions=True)
\ No newline at end of file
@@ -1,7 +1,7 @@
 """Conversation handler for Practice Buddy Bot"""
 import logging
 from enum import IntEnum
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 import messages as msg
@@ -42,6 +42,53 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return -1
 
 
+async def _handle_new_practice(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery):
+    """Handle the new practice button - ask for the instrument"""
+    return await ask_instrument(update, context, query=query)
+
+
+async def _handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery):
+    """Handle the help button"""
+    await query.edit_message_text(msg.HELP)
+    return -1
+
+
+async def _handle_violin(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery):
+    """Handle violin selection - ask for the piece name"""
+    context.user_data['instrument'] = 'ویولن'
+    logger.info("Instrument selected: ویولن")
+    await query.edit_message_text(msg.ASK_PIECE_NAME)
+    return State.PIECE_NAME
+
+
+async def _handle_custom(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery):
+    """Handle the other-instrument button - offer violin instead"""
+    keyboard = [
+        [InlineKeyboardButton(msg.BTN_YES_VIOLIN, callback_data='violin')],
+        [InlineKeyboardButton(msg.BTN_CANCEL, callback_data='cancel')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(msg.CUSTOM_INSTRUMENT, reply_markup=reply_markup)
+    return State.INSTRUMENT
+
+
+async def _handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery):
+    """Handle the cancel button"""
+    await query.edit_message_text(msg.CONVERSATION_CANCELLED)
+    context.user_data.clear()
+    return -1
+
+
+# callback_data -> button handler
+CALLBACK_HANDLERS = {
+    'new_practice': _handle_new_practice,
+    'help': _handle_help,
+    'violin': _handle_violin,
+    'custom_instrument': _handle_custom,
+    'cancel': _handle_cancel,
+}
+
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button callbacks"""
     query = update.callback_query
@@ -49,32 +96,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     logger.info(f"Button pressed: {query.data}")
     
-    if query.data == 'new_practice':
-        return await ask_instrument(update, context, query=query)
-    
-    elif query.data == 'help':
-        await query.edit_message_text(msg.HELP)
-        return -1
-    
-    elif query.data == 'violin':
-        context.user_data['instrument'] = 'ویولن'
-        logger.info("Instrument selected: ویولن")
-        await query.edit_message_text(msg.ASK_PIECE_NAME)
-        return State.PIECE_NAME
-    
-    elif query.data == 'custom_instrument':
-        keyboard = [
-            [InlineKeyboardButton(msg.BTN_YES_VIOLIN, callback_data='violin')],
-            [InlineKeyboardButton(msg.BTN_CANCEL, callback_data='cancel')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(msg.CUSTOM_INSTRUMENT, reply_markup=reply_markup)
-        return State.INSTRUMENT
-    
-    elif query.data == 'cancel':
-        await query.edit_message_text(msg.CONVERSATION_CANCELLED)
-        context.user_data.clear()
-        return -1
+    handler = CALLBACK_HANDLERS.get(query.data)
+    if handler:
+        return await handler(update, context, query)
 
 
 async def ask_instrument(update: Update, context: ContextTypes.DEFAULT_TYPE, query=None):
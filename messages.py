@@ -62,6 +62,9 @@ ANALYZING_TIMING = "⏱️ در حال تحلیل تایمینگ..."
 GENERATING_VISUALIZATION = "📊 در حال ساخت نمودار..."
 GENERATING_VIDEO = "🎬 در حال ساخت ویدیو گزارش..."
 UPLOADING_VIDEO = "📤 در حال آپلود ویدیو..."
+ANALYSIS_DONE = "✅ تحلیل کامل شد."
+STATUS_FAILED = "❌ تحلیل کامل نشد."
+VIDEO_SKIPPED_SHORT = "✅ تحلیل کامل شد. برای ضبط‌های کوتاه ویدیو ساخته نمی‌شه - نمودار بالا همه‌چیز رو نشون می‌ده."
 
 # Error messages
 ERROR_NO_AUDIO = "لطفاً یک فایل صوتی یا ویس بفرست."
@@ -0,0 +1,8 @@
+"""Test setup: import the bot's flat modules from the repository root"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# No librosa disk cache in tests (bot.py only sets these if they're unset)
+os.environ.setdefault('LIBROSA_CACHE_LEVEL', '0')
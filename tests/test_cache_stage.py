@@ -0,0 +1,24 @@
+"""cache_stage stores successful stage results only"""
+from librosa._cache import CacheManager
+
+import audio_processing
+
+
+def test_failures_are_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        audio_processing, '_disk_cache', CacheManager(str(tmp_path), verbose=0, level=10)(10)
+    )
+    calls = []
+
+    @audio_processing.cache_stage
+    def stage(x):
+        calls.append(x)
+        if x < 0:
+            raise ValueError('negative input')
+        return {'success': True, 'value': x}
+
+    assert stage(-1) == {'success': False, 'error': 'negative input'}
+    assert stage(-1) == {'success': False, 'error': 'negative input'}
+    assert stage(2) == {'success': True, 'value': 2}
+    assert stage(2) == {'success': True, 'value': 2}
+    assert calls == [-1, -1, 2]
@@ -0,0 +1,85 @@
+"""Two users' voice messages are handled at the same time"""
+import asyncio
+import types
+
+import bot
+import handlers.analysis as analysis
+
+
+class FakeMessage:
+    def __init__(self):
+        self.voice = types.SimpleNamespace(file_id='voice')
+
+    async def reply_text(self, text, **kwargs):
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        return self
+
+
+class FakeBot:
+    def __init__(self, events):
+        self.events = events
+
+    async def get_file(self, file_id):
+        return self
+
+    async def download_to_memory(self, out):
+        self.events.append('download')
+        out.write(b'OggS')
+
+
+def _patch_pipeline(monkeypatch, tmp_path, slots, analyze):
+    monkeypatch.setattr(analysis, 'analyze_audio', analyze)
+    monkeypatch.setattr(analysis, 'VOICE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(analysis, 'ARCHIVE_VOICES', False)
+    monkeypatch.setattr(analysis, 'ANALYSIS_SLOTS', asyncio.Semaphore(slots))
+    monkeypatch.setattr(analysis, 'trim_librosa_cache', lambda: None)
+
+
+def _run_two_users(events):
+    async def two_users():
+        await asyncio.gather(*[
+            analysis.handle_voice(
+                types.SimpleNamespace(message=FakeMessage()),
+                types.SimpleNamespace(bot=FakeBot(events), user_data={})
+            )
+            for _ in range(2)
+        ])
+
+    asyncio.run(two_users())
+
+
+def test_application_handles_updates_concurrently(monkeypatch):
+    monkeypatch.setattr(bot, 'BOT_TOKEN', '123456:TEST')
+    app = bot.build_application()
+    assert app.concurrent_updates > 1
+
+
+def test_handle_voice_calls_overlap(monkeypatch, tmp_path):
+    running = 0
+    peak = 0
+
+    async def slow_analysis(update, status, audio, *args):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.2)
+        running -= 1
+
+    _patch_pipeline(monkeypatch, tmp_path, 2, slow_analysis)
+    _run_two_users([])
+    assert peak == 2
+
+
+def test_slots_cover_the_download(monkeypatch, tmp_path):
+    # With one slot the second download waits for the first analysis
+    events = []
+
+    async def slow_analysis(update, status, audio, *args):
+        await asyncio.sleep(0.1)
+        events.append('analysed')
+
+    _patch_pipeline(monkeypatch, tmp_path, 1, slow_analysis)
+    _run_two_users(events)
+    assert events == ['download', 'analysed', 'download', 'analysed']
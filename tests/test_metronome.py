@@ -0,0 +1,33 @@
+"""Metronome detection on synthetic click tracks of known tempo"""
+import numpy as np
+import pytest
+
+from audio_processing import detect_metronome
+from config import TARGET_SR
+
+
+def click_track(bpm, duration=20.0, sr=TARGET_SR):
+    """A 440 Hz tone with a 2 kHz click on every beat, plus the beat times"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * sr)) / sr
+    y = 0.2 * np.sin(2 * np.pi * 440 * t) + 0.005 * rng.standard_normal(len(t))
+    k = np.arange(int(0.01 * sr)) / sr
+    burst = 0.8 * np.sin(2 * np.pi * 2000 * k) * np.exp(-k / 0.003)
+    beats = np.arange(0.1, duration - 0.05, 60 / bpm)
+    for beat in beats:
+        i = int(beat * sr)
+        y[i:i + len(burst)] += burst[:len(y) - i]
+    return y.astype(np.float32), beats
+
+
+@pytest.mark.parametrize('bpm', [60, 100, 120, 150])
+def test_click_track_tempo(bpm):
+    y, beats = click_track(bpm)
+    result = detect_metronome(y, TARGET_SR)
+
+    assert result['success']
+    assert result['num_beats'] == len(beats)
+    assert result['tempo'] == pytest.approx(bpm, abs=0.5)
+    # Every detected beat within ~one onset frame of a click
+    error = np.abs(result['beat_times'][:, None] - beats[None, :]).min(axis=1)
+    assert error.max() < 0.03
@@ -0,0 +1,48 @@
+"""A stage that raises doesn't leave the metronome plot task behind"""
+import asyncio
+import types
+
+import numpy as np
+import pytest
+
+import handlers.analysis as analysis
+
+
+class FakeMessage:
+    async def reply_text(self, text, **kwargs):
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        return self
+
+
+def test_plot_task_cancelled_when_a_stage_raises(monkeypatch):
+    loaded = {'success': True, 'y': np.zeros(16000, np.float32), 'sr': 16000,
+              'duration': 1.0, 'sample_rate': 16000}
+    metronome = {'success': True, 'num_beats': 0, 'tempo': 0,
+                 'beat_times': np.array([]), 'onset_env': np.array([])}
+    renders = []
+
+    async def run_blocking(func, *args):
+        if func is analysis.extract_pitch:
+            await asyncio.sleep(0)  # Let the render start
+            raise RuntimeError('worker died')
+        return loaded if func is analysis.load_audio else metronome
+
+    async def run_render(func, *args):
+        renders.append(asyncio.current_task())
+        await asyncio.Event().wait()  # Never finishes on its own
+
+    monkeypatch.setattr(analysis, 'run_blocking', run_blocking)
+    monkeypatch.setattr(analysis, 'run_render', run_render)
+
+    async def analyze():
+        message = FakeMessage()
+        with pytest.raises(RuntimeError):
+            await analysis.analyze_audio(
+                types.SimpleNamespace(message=message), message, None, 'voice.ogg', 'violin', 'piece'
+            )
+        # Checked before asyncio.run() cancels whatever is left over
+        assert renders and renders[0].cancelled()
+
+    asyncio.run(analyze())
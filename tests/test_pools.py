@@ -0,0 +1,22 @@
+"""A worker that dies takes its pool with it - the next call gets a new one"""
+import asyncio
+import os
+
+import handlers.analysis as analysis
+
+
+def crash_once(marker):
+    """Kill the worker process the first time, succeed on the retry"""
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return 'ok'
+
+
+def test_broken_pool_is_replaced(monkeypatch, tmp_path):
+    broken = analysis._new_pool(1)
+    monkeypatch.setattr(analysis, 'ANALYSIS_POOL', broken)
+
+    assert asyncio.run(analysis.run_blocking(crash_once, str(tmp_path / 'crashed'))) == 'ok'
+    assert analysis.ANALYSIS_POOL is not broken
+    analysis.ANALYSIS_POOL.shutdown()
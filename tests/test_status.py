@@ -0,0 +1,66 @@
+"""The status message always ends on how the analysis went"""
+import asyncio
+import types
+
+from telegram.error import BadRequest
+
+import handlers.analysis as analysis
+import messages as msg
+
+
+class StatusMessage:
+    def __init__(self, fail_edits=False):
+        self.fail_edits = fail_edits
+        self.edits = []
+        self.replies = []
+        self.voice = types.SimpleNamespace(file_id='voice')
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+        if self.fail_edits:
+            raise BadRequest('Message is not modified')
+        return self
+
+
+class FakeBot:
+    async def get_file(self, file_id):
+        return self
+
+    async def download_to_memory(self, out):
+        out.write(b'OggS')
+
+
+def _handle(monkeypatch, tmp_path, message, analyze):
+    monkeypatch.setattr(analysis, 'analyze_audio', analyze)
+    monkeypatch.setattr(analysis, 'VOICE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(analysis, 'ARCHIVE_VOICES', False)
+    monkeypatch.setattr(analysis, 'trim_librosa_cache', lambda: None)
+    asyncio.run(analysis.handle_voice(
+        types.SimpleNamespace(message=message),
+        types.SimpleNamespace(bot=FakeBot(), user_data={})
+    ))
+
+
+def test_failed_status_edits_do_not_abort(monkeypatch, tmp_path):
+    async def analyze(update, status, *args):
+        await analysis.set_status(status, msg.ANALYZING_AUDIO)
+        return msg.ANALYSIS_DONE
+
+    message = StatusMessage(fail_edits=True)
+    _handle(monkeypatch, tmp_path, message, analyze)
+    assert message.edits == [msg.ANALYZING_AUDIO, msg.ANALYSIS_DONE]
+    assert msg.ERROR_ANALYSIS_FAILED not in ''.join(message.replies)
+
+
+def test_status_is_finalized_when_analysis_raises(monkeypatch, tmp_path):
+    async def analyze(update, status, *args):
+        await analysis.set_status(status, msg.EXTRACTING_PITCH)
+        raise RuntimeError('worker died')
+
+    message = StatusMessage()
+    _handle(monkeypatch, tmp_path, message, analyze)
+    assert message.edits[-1] == msg.STATUS_FAILED
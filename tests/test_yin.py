@@ -0,0 +1,49 @@
+"""The numba YIN kernel against librosa.yin"""
+import librosa
+import numpy as np
+
+from config import AUDIO_PARAMS, TARGET_SR
+from yin_numba import yin
+
+HOP_LENGTH = int(0.05 * TARGET_SR)  # as in extract_pitch
+
+
+def harmonic_tone(freqs, sr=TARGET_SR):
+    """Five-harmonic tone following the per-sample frequencies, with light noise"""
+    phase = 2 * np.pi * np.cumsum(freqs) / sr
+    y = 0.3 * sum(0.6 ** k * np.sin((k + 1) * phase) for k in range(5))
+    y += 0.003 * np.random.default_rng(0).standard_normal(len(y))
+    return y.astype(np.float32)
+
+
+def _both(y):
+    kwargs = dict(fmin=AUDIO_PARAMS['fmin'], fmax=AUDIO_PARAMS['fmax'], hop_length=HOP_LENGTH)
+    return yin(y, TARGET_SR, **kwargs), librosa.yin(y, sr=TARGET_SR, **kwargs)
+
+
+def test_matches_librosa_on_a_pitch_step():
+    t = np.arange(4 * TARGET_SR) / TARGET_SR
+    f0, expected = _both(harmonic_tone(np.where(t < 2, 440.0, 660.0)))
+
+    assert f0.shape == expected.shape
+    cents = 1200 * np.abs(np.log2(f0 / expected))
+    assert cents.max() < 2
+
+
+def test_matches_librosa_across_the_violin_range():
+    t = np.arange(4 * TARGET_SR) / TARGET_SR
+    f0, expected = _both(harmonic_tone(np.geomspace(200, 1700, len(t))))
+
+    cents = 1200 * np.abs(np.log2(f0 / expected))
+    assert cents.max() < 2
+
+
+def test_silence_is_unvoiced():
+    y = np.zeros(TARGET_SR, dtype=np.float32)
+    y[TARGET_SR // 2:] = harmonic_tone(np.full(TARGET_SR // 2, 440.0))
+    f0, _ = _both(y)
+
+    first_voiced = int(np.argmax(~np.isnan(f0)))
+    assert first_voiced > 0
+    assert np.isnan(f0[:first_voiced]).all()
+    assert np.abs(f0[first_voiced + 2:] - 440).max() < 5
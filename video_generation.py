@@ -1,42 +1,63 @@
 """Video generation functions for Practice Buddy Bot"""
+import os
+import subprocess
+import threading
+import time
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.patches import Rectangle
 from config import VIZ_PARAMS
 
+VIDEO_FPS = 10
+VIDEO_TIMEOUT = 300  # seconds (5 minutes)
 
-def create_video_frame(df, notes_df, current_time, audio_duration):
-    """Create a single frame - simplified with progressive line drawing"""
-    try:
-        fig, (ax1, ax2) = plt.subplots(
-            2, 1,
+
+def _pixel_coords(ax, x, y, height):
+    """Data points of an axes as a flat [x0, y0, x1, y1, ...] list in image pixels"""
+    pts = ax.transData.transform(np.column_stack([x, y]))
+    pts[:, 1] = height - pts[:, 1]  # Display y runs up, image y runs down
+    return pts.ravel()
+
+
+def _axes_box(ax, height):
+    """(left, top, right, bottom) of an axes in image pixels"""
+    x0, y0, x1, y1 = ax.get_window_extent().extents
+    return int(np.floor(x0)), int(np.floor(height - y1)), int(np.ceil(x1)), int(np.ceil(height - y0))
+
+
+class FrameRenderer:
+    """Video frames revealed from one fully drawn plot - matplotlib lays out
+    the axes, labels and reference lines once, Pillow draws the complete
+    curves once, and each frame copies the part left of the cursor over the
+    empty background and adds the cursor and the title"""
+    
+    def __init__(self, frames, audio_duration):
+        from matplotlib.font_manager import FontProperties, findfont
+        from PIL import Image, ImageDraw, ImageFont
+        
+        self.audio_duration = audio_duration
+        times = np.asarray(frames['time_s'])
+        f0 = np.asarray(frames['f0'])
+        
+        fig = Figure(
             figsize=(12, 8),
             dpi=60  # Lower DPI for faster rendering
         )
+        FigureCanvasAgg(fig)
+        ax1, ax2 = fig.subplots(2, 1)
         
-        # Filter data up to current time
-        mask = df['time_s'] <= current_time
-        df_current = df[mask]
-        
-        # Plot 1: Pitch tracking (draw full axes, progressive line)
+        # Plot 1: Pitch tracking (full axes, progressive line)
         ax1.set_xlim(0, audio_duration)
-        ax1.set_ylim(df['f0'].min() * 0.95, df['f0'].max() * 1.05)
+        ax1.set_ylim(f0.min() * 0.95, f0.max() * 1.05)
         ax1.set_xlabel('Time (seconds)', fontsize=11)
         ax1.set_ylabel('Frequency (Hz)', fontsize=11)
-        ax1.set_title(f'Pitch - {current_time:.1f}s / {audio_duration:.1f}s', fontsize=13, fontweight='bold')
+        title = ax1.set_title(f'Pitch - {0:.1f}s / {audio_duration:.1f}s', fontsize=13, fontweight='bold')
         ax1.grid(True, alpha=0.3)
         
-        # Draw pitch line up to current time only
-        if len(df_current) > 0:
-            ax1.plot(df_current['time_s'], df_current['f0'], color='blue', linewidth=2)
-            ax1.plot(df_current['time_s'], df_current['ideal_freq'], color='gray', linewidth=1, linestyle='--', alpha=0.5)
-        
-        # Current position marker
-        ax1.axvline(x=current_time, color='red', linestyle='-', linewidth=2, alpha=0.8)
-        
-        # Plot 2: Cents deviation (draw full axes, progressive line)
+        # Plot 2: Cents deviation (full axes, progressive line)
         ax2.set_xlim(0, audio_duration)
         ax2.set_ylim(-50, 50)
         ax2.set_xlabel('Time (seconds)', fontsize=11)
@@ -51,50 +72,118 @@ def create_video_frame(df, notes_df, current_time, audio_duration):
         ax2.axhline(y=25, color='orange', linestyle='--', linewidth=1, alpha=0.5)
         ax2.axhline(y=-25, color='orange', linestyle='--', linewidth=1, alpha=0.5)
         
-        # Draw cents line up to current time only
-        if len(df_current) > 0:
-            ax2.plot(df_current['time_s'], df_current['cents_off'], color='purple', linewidth=2)
+        fig.tight_layout()
         
-        # Current position marker
-        ax2.axvline(x=current_time, color='red', linestyle='-', linewidth=2, alpha=0.8)
-        
-        plt.tight_layout()
-        
-        # Convert to image
+        # Lay out with the title in place, then blank it - Pillow writes the
+        # running time into the same spot on every frame
         fig.canvas.draw()
-        buf = np.frombuffer(fig.canvas.buffer_rgba(), dtype=np.uint8)
         w, h = fig.canvas.get_width_height()
-        img = buf.reshape((h, w, 4))[:, :, :3]  # Drop alpha
+        x0, y0, x1, y1 = title.get_window_extent().extents
+        self.title_font = ImageFont.truetype(
+            findfont(FontProperties(weight='bold')),
+            round(13 * fig.dpi / 72)
+        )
+        self.title_rows = slice(max(int(h - y1) - 4, 0), min(int(np.ceil(h - y0)) + 4, h))
+        self.title_xy = ((x0 + x1) / 2, (h - (y0 + y1) / 2) - self.title_rows.start)
+        title.set_text('')
+        fig.canvas.draw()
+        buf = np.frombuffer(fig.canvas.buffer_rgba(), dtype=np.uint8)
+        background = Image.fromarray(buf.reshape((h, w, 4))[:, :, :3].copy())  # Drop alpha
         
-        plt.close(fig)
-        return img
+        # The complete curves, each clipped to its axes like matplotlib does
+        box1 = _axes_box(ax1, h)
+        box2 = _axes_box(ax2, h)
+        full = background.copy()
+        for box, ax, lines in [
+            (box1, ax1, [
+                (frames['ideal_freq'], (192, 192, 192), 1),  # Gray at alpha 0.5
+                (f0, (0, 0, 255), 2),
+            ]),
+            (box2, ax2, [
+                (frames['cents_off'], (128, 0, 128), 2),
+            ]),
+        ]:
+            panel = full.crop(box)
+            draw = ImageDraw.Draw(panel)
+            offset = np.tile(box[:2], len(times))
+            for values, fill, width in lines:
+                if len(times) >= 2:
+                    xy = _pixel_coords(ax, times, values, h) - offset
+                    draw.line(xy.tolist(), fill=fill, width=width, joint='curve')
+            full.paste(panel, box[:2])
         
-    except Exception as e:
-        print(f"Error creating frame at {current_time}s: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+        self.background = np.asarray(background)
+        self.full = np.asarray(full)
+        # (top, bottom, left, right) of both axes, for the reveal and the cursor
+        self.boxes = [(top, bottom, left, right) for left, top, right, bottom in (box1, box2)]
+        self.cursor_px = ax1.transData.transform([(0, 0), (audio_duration, 0)])[:, 0]
+    
+    def render(self, current_time):
+        """Draw the frame at a specific timestamp and return it as an RGB array"""
+        from PIL import Image, ImageDraw
+        
+        try:
+            # Cursor position, linear in time along the x axis
+            frac = current_time / self.audio_duration
+            cursor_x = int(round(self.cursor_px[0] + frac * (self.cursor_px[1] - self.cursor_px[0])))
+            
+            frame = self.background.copy()
+            for top, bottom, left, right in self.boxes:
+                # Curves up to the cursor, then the cursor itself
+                reveal = min(max(cursor_x, left), right)
+                frame[top:bottom, left:reveal] = self.full[top:bottom, left:reveal]
+                frame[top:bottom, max(cursor_x - 1, left):min(cursor_x + 1, right)] = (255, 51, 51)  # Red at alpha 0.8
+            
+            # Title with the running time
+            strip = Image.fromarray(frame[self.title_rows])
+            ImageDraw.Draw(strip).text(
+                self.title_xy,
+                f'Pitch - {current_time:.1f}s / {self.audio_duration:.1f}s',
+                font=self.title_font,
+                fill='black',
+                anchor='mm'
+            )
+            frame[self.title_rows] = np.asarray(strip)
+            
+            return frame
+            
+        except Exception as e:
+            print(f"Error creating frame at {current_time}s: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
 
 
-def generate_video_report(df, notes_df, beat_times, audio_path, output_path):
-    """Generate synchronized video report with audio"""
+def _write_pipe(fd, data):
+    """Write data to a pipe and close it - ffmpeg reads it as an input file"""
     try:
-        from moviepy.editor import VideoClip, AudioFileClip
-        import librosa
-        import signal as sig
-        
-        # Timeout handler
-        def timeout_handler(signum, frame):
-            raise TimeoutError("Video generation timeout (5 minutes)")
+        with open(fd, 'wb') as f:
+            f.write(data)
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its return code reports why
+
+
+def generate_video_report(df, notes_df, beat_times, audio_path, output_path, audio_duration=None, audio_data=None):
+    """Generate synchronized video report with audio
+    
+    df: pitch frames, as a DataFrame or a dict of arrays
+    audio_data: contents of the audio file, if the caller already has them -
+    piped to ffmpeg instead of reading audio_path
+    """
+    ffmpeg = None
+    try:
+        from moviepy.config import get_setting
         
-        # Set 5 minute timeout
-        sig.signal(sig.SIGALRM, timeout_handler)
-        sig.alarm(300)  # 5 minutes
+        # 5 minute deadline, checked between frames - works in any thread or
+        # worker process and leaves SIGALRM alone
+        deadline = time.monotonic() + VIDEO_TIMEOUT
         
         print("Starting video generation...")
         
-        # Load audio duration
-        audio_duration = librosa.get_duration(path=audio_path)
+        # Audio duration - read from the file only if the caller doesn't know it
+        if audio_duration is None:
+            import librosa
+            audio_duration = librosa.get_duration(path=audio_path)
         print(f"Audio duration: {audio_duration:.2f}s")
         
         # Limit video generation to max 2 minutes of audio
@@ -102,62 +191,75 @@ def generate_video_report(df, notes_df, beat_times, audio_path, output_path):
             print(f"Warning: Audio is {audio_duration:.1f}s, truncating video to 120s")
             audio_duration = 120
         
+        # Draw the complete plot once; frames reveal it up to the cursor
+        renderer = FrameRenderer(df, audio_duration)
+        
         # Test create first frame to catch errors early
         print("Creating test frame...")
-        test_frame = create_video_frame(df, notes_df, 0, audio_duration)
+        test_frame = renderer.render(0)
         if test_frame is None:
             raise Exception("Failed to create test frame - check error messages above")
         
         print(f"✓ Test frame OK: {test_frame.shape}")
+        h, w = test_frame.shape[:2]
         
-        # Create video clip
-        frame_count = [0]  # Use list to modify in closure
+        # Same frame grid moviepy's VideoClip used
+        frame_times = np.arange(0, audio_duration, 1 / VIDEO_FPS)
         
-        def make_frame(t):
-            frame_count[0] += 1
-            if frame_count[0] % 10 == 0:  # Progress update every 10 frames
-                print(f"  Rendering frame {frame_count[0]} (t={t:.1f}s)...")
-            
-            frame = create_video_frame(df, notes_df, t, audio_duration)
-            if frame is None:
-                print(f"Warning: Failed to create frame at t={t:.2f}s, using fallback")
-                return test_frame
-            return frame
-        
-        print("Creating video clip (this will take a minute)...")
-        video = VideoClip(make_frame, duration=audio_duration)
-        video = video.set_fps(10)
-        
-        print("Loading audio...")
-        audio = AudioFileClip(audio_path)
-        audio = audio.subclip(0, audio_duration)  # Match video duration
-        final_video = video.set_audio(audio)
+        # Original audio, from memory through a second pipe when we have it
+        audio_input, audio_fds = audio_path, ()
+        if audio_data is not None:
+            read_fd, write_fd = os.pipe()
+            audio_input, audio_fds = f'pipe:{read_fd}', (read_fd,)
         
+        # Raw RGB frames go straight into ffmpeg, muxed with the original audio
         print(f"Writing video to {output_path}...")
-        final_video.write_videofile(
-            output_path,
-            fps=10,
-            codec='libx264',
-            audio_codec='aac',
-            bitrate='1500k',  # Reduced from 2000k for smaller file
-            preset='faster',  # Balance between speed and compression
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True,
-            verbose=False,
-            logger=None,
-            threads=2  # Limit threads to avoid memory issues
+        ffmpeg = subprocess.Popen(
+            [
+                get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}',
+                '-r', str(VIDEO_FPS), '-i', '-',
+                '-i', audio_input,
+                '-map', '0:v', '-map', '1:a', '-t', f'{audio_duration:.3f}',
+                '-c:v', 'libx264',
+                '-preset', 'faster',  # Balance between speed and compression
+                '-b:v', '1500k',  # Reduced from 2000k for smaller file
+                '-pix_fmt', 'yuv420p',
+                '-c:a', 'aac',
+                '-threads', '2',  # Limit threads to avoid memory issues
+                output_path
+            ],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=audio_fds
         )
+        if audio_data is not None:
+            os.close(read_fd)
+            threading.Thread(target=_write_pipe, args=(write_fd, audio_data), daemon=True).start()
+        
+        for i, t in enumerate(frame_times):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Video generation timeout (5 minutes)")
+            frame = renderer.render(t)
+            if frame is None:
+                print(f"Warning: Failed to create frame at t={t:.2f}s, using fallback")
+                frame = test_frame
+            try:
+                ffmpeg.stdin.write(frame.tobytes())
+            except BrokenPipeError:
+                break  # ffmpeg exited; its error is reported below
+            if (i + 1) % 100 == 0:  # Progress update every 100 frames
+                print(f"  Rendered {i + 1}/{len(frame_times)} frames...")
         
-        # Cancel alarm
-        sig.alarm(0)
+        try:
+            _, err = ffmpeg.communicate(timeout=max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            raise TimeoutError("Video generation timeout (5 minutes)")
+        if ffmpeg.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {err.decode(errors='replace').strip()}")
         
         print("✓ Video generation complete!")
         
-        # Clean up
-        video.close()
-        audio.close()
-        final_video.close()
-        
         return {
             'success': True,
             'video_path': output_path,
@@ -177,4 +279,8 @@ def generate_video_report(df, notes_df, beat_times, audio_path, output_path):
         return {
             'success': False,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+    finally:
+        if ffmpeg is not None and ffmpeg.poll() is None:
+            ffmpeg.kill()
+            ffmpeg.wait()
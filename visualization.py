@@ -1,522 +1,144 @@
 """Visualization functions for Practice Buddy Bot"""
+import os
+from io import BytesIO
 import numpy as np
-import matplotlib.pyplot as plt
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.lines import Line2D
 from matplotlib.patches import Rectangle
-from scipy import signal
-from config import VIZ_PARAMS, METRONOME_PARAMS
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for video generation
+from matplotlib.collections import PatchCollection
+from matplotlib.colors import to_rgba_array
+from config import VIZ_PARAMS, METRONOME_PARAMS, AUDIO_PARAMS
 
 
-def visualize_metronome_detection(y, sr, beat_times, filepath):
-    """Create visualization of waveform with detected beats highlighted"""
-    try:
-        # Create time array for x-axis
-        duration = len(y) / sr
-        time = np.linspace(0, duration, len(y))
-        
-        # Create figure with 2 subplots
-        fig, (ax1, ax2) = plt.subplots(
-            2, 1, 
-            figsize=(VIZ_PARAMS['figure_width'], VIZ_PARAMS['figure_height'])
-        )
-        
-        # Plot 1: Full waveform with beat markers
-        ax1.plot(time, y, alpha=0.6, linewidth=0.5, color='blue', label='Waveform')
-        ax1.set_xlabel('Time (seconds)', fontsize=12)
-        ax1.set_ylabel('Amplitude', fontsize=12)
-        ax1.set_title('Audio Waveform with Detected Metronome Beats', fontsize=14, fontweight='bold')
-        ax1.grid(True, alpha=0.3)
-        
-        # Mark detected beats with vertical lines
-        for beat_time in beat_times:
-            ax1.axvline(x=beat_time, color='red', linestyle='--', linewidth=2, alpha=0.7)
-        
-        # Add legend
-        legend_elements = [
-            Line2D([0], [0], color='blue', linewidth=1, label='Audio Signal'),
-            Line2D([0], [0], color='red', linestyle='--', linewidth=2, label='Detected Beats')
-        ]
-        ax1.legend(handles=legend_elements, loc='upper right')
-        
-        # Plot 2: Band-pass filtered signal (what the detector sees)
-        sos = signal.butter(4, [800, 4000], 'bp', fs=sr, output='sos')
-        y_filtered = signal.sosfilt(sos, y)
-        
-        ax2.plot(time, y_filtered, alpha=0.6, linewidth=0.5, color='green', label='Filtered (800-4000Hz)')
-        ax2.set_xlabel('Time (seconds)', fontsize=12)
-        ax2.set_ylabel('Amplitude', fontsize=12)
-        ax2.set_title('Band-Pass Filtered Signal (What Metronome Detector Sees)', fontsize=14, fontweight='bold')
-        ax2.grid(True, alpha=0.3)
-        
-        # Mark detected beats on filtered signal too
-        for beat_time in beat_times:
-            ax2.axvline(x=beat_time, color='red', linestyle='--', linewidth=2, alpha=0.7)
-        
-        ax2.legend(loc='upper right')
-        
-        plt.tight_layout()
-        
-        # Save the plot
-        plot_filename = filepath.replace('.ogg', '_metronome_analysis.png')
-        plt.savefig(plot_filename, dpi=VIZ_PARAMS['dpi'], bbox_inches='tight')
-        plt.close()
-        
-        return {
-            'success': True,
-            'plot_path': plot_filename
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+def _figure(**kwargs):
+    """Figure on its own Agg canvas - no pyplot figure registry to keep or close"""
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
 
 
-def visualize_pitch_and_notes(df, notes_df, beat_times, filepath):
-    """Create comprehensive visualization with pitch, notes, and timing"""
-    try:
-        # Create figure with 4 subplots (added timing accuracy plot)
-        fig, (ax1, ax2, ax3, ax4) = plt.subplots(
-            4, 1,
-            figsize=(VIZ_PARAMS['figure_width'], VIZ_PARAMS['figure_height'] + 6)
-        )
-        
-        # Plot 1: Pitch over time with note labels
-        ax1.plot(df['time_s'], df['f0'], color='blue', linewidth=1, alpha=0.7, label='Detected Pitch')
-        ax1.plot(df['time_s'], df['ideal_freq'], color='gray', linewidth=1, linestyle='--', alpha=0.5, label='Ideal Frequency')
-        
-        # Add metronome beats
-        for beat_time in beat_times:
-            ax1.axvline(x=beat_time, color='red', linestyle=':', linewidth=1, alpha=0.4)
-        
-        # Mark note onsets
-        onset_times = df[df['is_onset']]['time_s'].values
-        for onset_time in onset_times:
-            ax1.axvline(x=onset_time, color='green', linestyle='-', linewidth=1.5, alpha=0.6)
-        
-        ax1.set_xlabel('Time (seconds)', fontsize=11)
-        ax1.set_ylabel('Frequency (Hz)', fontsize=11)
-        ax1.set_title('Pitch Tracking with Note Onsets and Metronome Beats', fontsize=13, fontweight='bold')
-        ax1.grid(True, alpha=0.3)
-        ax1.legend(loc='upper right', fontsize=9)
-        
-        # Plot 2: Note segments with color coding by tuning
-        ax2.set_xlabel('Time (seconds)', fontsize=11)
-        ax2.set_ylabel('Note', fontsize=11)
-        ax2.set_title('Detected Notes with Tuning Accuracy', fontsize=13, fontweight='bold')
-        ax2.grid(True, alpha=0.3, axis='x')
-        
-        # Add metronome beats
-        for beat_time in beat_times:
-            ax2.axvline(x=beat_time, color='red', linestyle=':', linewidth=1, alpha=0.4)
-        
-        # Draw note segments as colored rectangles
-        y_pos = 0
-        unique_notes_list = notes_df['note_name'].unique()
-        note_to_y = {note: i for i, note in enumerate(unique_notes_list)}
-        
-        for _, note in notes_df.iterrows():
-            y_position = note_to_y[note['note_name']]
-            
-            # Color based on tuning accuracy
-            abs_cents = abs(note['avg_cents_off'])
-            if abs_cents <= 10:
-                color = 'green'
-                alpha = 0.7
-            elif abs_cents <= 25:
-                color = 'yellow'
-                alpha = 0.7
-            else:
-                color = 'red'
-                alpha = 0.7
-            
-            # Draw rectangle for note duration
-            rect = Rectangle(
-                (note['start_time'], y_position - 0.4),
-                note['duration'],
-                0.8,
-                facecolor=color,
-                alpha=alpha,
-                edgecolor='black',
-                linewidth=0.5
-            )
-            ax2.add_patch(rect)
-            
-            # Add note label
-            if note['duration'] > 0.3:  # Only label if note is long enough
-                ax2.text(
-                    note['start_time'] + note['duration']/2,
-                    y_position,
-                    note['note_name'],
-                    ha='center',
-                    va='center',
-                    fontsize=8,
-                    fontweight='bold'
-                )
-        
-        ax2.set_yticks(range(len(unique_notes_list)))
-        ax2.set_yticklabels(unique_notes_list)
-        ax2.set_ylim(-0.5, len(unique_notes_list) - 0.5)
-        
-        # Legend for tuning colors
-        legend_elements = [
-            Rectangle((0,0), 1, 1, facecolor='green', alpha=0.7, label='In tune (≤10¢)'),
-            Rectangle((0,0), 1, 1, facecolor='yellow', alpha=0.7, label='Slightly off (≤25¢)'),
-            Rectangle((0,0), 1, 1, facecolor='red', alpha=0.7, label='Out of tune (>25¢)'),
-            Line2D([0], [0], color='red', linestyle=':', linewidth=1, label='Metronome')
-        ]
-        ax2.legend(handles=legend_elements, loc='upper right', fontsize=9)
-        
-        # Plot 3: Cents deviation over time
-        ax3.plot(df['time_s'], df['cents_off'], color='purple', linewidth=1, alpha=0.7)
-        ax3.axhline(y=0, color='black', linestyle='-', linewidth=1)
-        ax3.axhline(y=10, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=-10, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=25, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=-25, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
-        
-        # Add metronome beats
-        for beat_time in beat_times:
-            ax3.axvline(x=beat_time, color='red', linestyle=':', linewidth=1, alpha=0.4)
-        
-        ax3.set_xlabel('Time (seconds)', fontsize=11)
-        ax3.set_ylabel('Cents Deviation', fontsize=11)
-        ax3.set_title('Tuning Accuracy Over Time', fontsize=13, fontweight='bold')
-        ax3.grid(True, alpha=0.3)
-        ax3.set_ylim(-50, 50)
-        
-        # Plot 4: TIMING ACCURACY - New in Iteration 8
-        ax4.set_xlabel('Time (seconds)', fontsize=11)
-        ax4.set_ylabel('Timing Error (ms)', fontsize=11)
-        ax4.set_title('Timing Accuracy Relative to Metronome', fontsize=13, fontweight='bold')
-        ax4.grid(True, alpha=0.3)
-        
-        # Add metronome beats as vertical lines
-        for beat_time in beat_times:
-            ax4.axvline(x=beat_time, color='red', linestyle=':', linewidth=1.5, alpha=0.5, label='Metronome Beat' if beat_time == beat_times[0] else '')
-        
-        # Plot timing error for each note
-        if 'timing_error_ms' in notes_df.columns:
-            # Scatter plot for each note's timing error
-            colors = []
-            for error in notes_df['abs_timing_error_ms']:
-                if error <= 30:
-                    colors.append('green')
-                elif error <= 50:
-                    colors.append('yellow')
-                else:
-                    colors.append('red')
-            
-            ax4.scatter(notes_df['start_time'], notes_df['timing_error_ms'], 
-                       c=colors, s=100, alpha=0.7, edgecolors='black', linewidth=0.5,
-                       label='Note Onset')
-            
-            # Zero line (perfect timing)
-            ax4.axhline(y=0, color='black', linestyle='-', linewidth=1.5)
-            
-            # Reference lines for acceptable timing
-            ax4.axhline(y=50, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
-            ax4.axhline(y=-50, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
-            ax4.axhline(y=30, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-            ax4.axhline(y=-30, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-            
-            # Add text annotations for significantly off-beat notes
-            for _, note in notes_df.iterrows():
-                if note['abs_timing_error_ms'] > 80:
-                    ax4.annotate(f"{note['timing_error_ms']:.0f}ms", 
-                               (note['start_time'], note['timing_error_ms']),
-                               textcoords="offset points", xytext=(0,10), ha='center',
-                               fontsize=8, color='red', fontweight='bold')
-        
-        ax4.set_ylim(-150, 150)
-        ax4.legend(loc='upper right', fontsize=9)
-        
-        plt.tight_layout()
-        
-        # Save the plot
-        plot_filename = filepath.replace('.ogg', '_pitch_analysis.png')
-        plt.savefig(plot_filename, dpi=VIZ_PARAMS['dpi'], bbox_inches='tight')
-        plt.close()
-        
-        return {
-            'success': True,
-            'plot_path': plot_filename
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+def _figure_size(duration):
+    """(width in inches, dpi) for a plot of `duration` seconds - wider for
+    long recordings, at a dpi that keeps the image no wider in pixels"""
+    width = min(VIZ_PARAMS['figure_width'] * max(1, duration / 30), VIZ_PARAMS['max_figure_width'])
+    dpi = max(72, round(VIZ_PARAMS['dpi'] * VIZ_PARAMS['figure_width'] / width))
+    return width, dpi
 
 
-def create_video_frame(df, notes_df, current_time, audio_duration):
-    """Create a single frame for the video at a specific timestamp"""
-    try:
-        fig, (ax1, ax2, ax3) = plt.subplots(
-            3, 1,
-            figsize=(VIZ_PARAMS['figure_width'], VIZ_PARAMS['figure_height'] + 4),
-            dpi=100  # Add explicit DPI
-        )
-        
-        # Define window size (show 10 seconds of data at a time)
-        window_size = 10
-        time_start = max(0, current_time - window_size / 2)
-        time_end = min(audio_duration, current_time + window_size / 2)
-        
-        # Filter data for current window
-        mask = (df['time_s'] >= time_start) & (df['time_s'] <= time_end)
-        df_window = df[mask]
-        
-        # Plot 1: Pitch tracking
-        if len(df_window) > 0:
-            ax1.plot(df_window['time_s'], df_window['f0'], color='blue', linewidth=2, alpha=0.7)
-            ax1.plot(df_window['time_s'], df_window['ideal_freq'], color='gray', linewidth=1, linestyle='--', alpha=0.5)
-        
-        # Current time marker
-        ax1.axvline(x=current_time, color='red', linestyle='-', linewidth=3, alpha=0.8, label='Current Time')
-        
-        ax1.set_xlim(time_start, time_end)
-        ax1.set_xlabel('Time (seconds)', fontsize=12)
-        ax1.set_ylabel('Frequency (Hz)', fontsize=12)
-        ax1.set_title(f'Pitch Tracking - Time: {current_time:.2f}s', fontsize=14, fontweight='bold')
-        ax1.grid(True, alpha=0.3)
-        ax1.legend(loc='upper right')
-        
-        # Plot 2: Note segments
-        ax2.set_xlabel('Time (seconds)', fontsize=12)
-        ax2.set_ylabel('Note', fontsize=12)
-        ax2.set_title('Detected Notes', fontsize=14, fontweight='bold')
-        ax2.grid(True, alpha=0.3, axis='x')
-        
-        # Filter notes in current window
-        notes_window = notes_df[
-            ((notes_df['start_time'] >= time_start) & (notes_df['start_time'] <= time_end)) |
-            ((notes_df['end_time'] >= time_start) & (notes_df['end_time'] <= time_end)) |
-            ((notes_df['start_time'] <= time_start) & (notes_df['end_time'] >= time_end))
-        ]
-        
-        if len(notes_window) > 0:
-            unique_notes = notes_window['note_name'].unique()
-            note_to_y = {note: i for i, note in enumerate(unique_notes)}
-            
-            for _, note in notes_window.iterrows():
-                y_position = note_to_y[note['note_name']]
-                abs_cents = abs(note['avg_cents_off'])
-                
-                if abs_cents <= 10:
-                    color = 'green'
-                elif abs_cents <= 25:
-                    color = 'yellow'
-                else:
-                    color = 'red'
-                
-                # Highlight current note
-                alpha = 0.9 if note['start_time'] <= current_time <= note['end_time'] else 0.5
-                linewidth = 2 if note['start_time'] <= current_time <= note['end_time'] else 0.5
-                
-                rect = Rectangle(
-                    (note['start_time'], y_position - 0.4),
-                    note['duration'],
-                    0.8,
-                    facecolor=color,
-                    alpha=alpha,
-                    edgecolor='black',
-                    linewidth=linewidth
-                )
-                ax2.add_patch(rect)
-                
-                if note['duration'] > 0.3:
-                    ax2.text(
-                        note['start_time'] + note['duration']/2,
-                        y_position,
-                        note['note_name'],
-                        ha='center',
-                        va='center',
-                        fontsize=10,
-                        fontweight='bold'
-                    )
-            
-            ax2.set_yticks(range(len(unique_notes)))
-            ax2.set_yticklabels(unique_notes)
-            ax2.set_ylim(-0.5, len(unique_notes) - 0.5)
-        
-        # Current time marker
-        ax2.axvline(x=current_time, color='red', linestyle='-', linewidth=3, alpha=0.8)
-        ax2.set_xlim(time_start, time_end)
-        
-        # Plot 3: Cents deviation
-        if len(df_window) > 0:
-            ax3.plot(df_window['time_s'], df_window['cents_off'], color='purple', linewidth=2, alpha=0.7)
-        
-        ax3.axhline(y=0, color='black', linestyle='-', linewidth=1)
-        ax3.axhline(y=10, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=-10, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=25, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=-25, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
-        
-        # Current time marker
-        ax3.axvline(x=current_time, color='red', linestyle='-', linewidth=3, alpha=0.8)
-        
-        ax3.set_xlim(time_start, time_end)
-        ax3.set_ylim(-50, 50)
-        ax3.set_xlabel('Time (seconds)', fontsize=12)
-        ax3.set_ylabel('Cents Deviation', fontsize=12)
-        ax3.set_title('Tuning Accuracy', fontsize=14, fontweight='bold')
-        ax3.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        
-        # Convert to image array
-        fig.canvas.draw()
-        
-        # Get the RGBA buffer from the figure
-        w, h = fig.canvas.get_width_height()
-        buf = np.frombuffer(fig.canvas.tostring_rgb(), dtype=np.uint8)
-        buf = buf.reshape((h, w, 3))
-        
-        plt.close(fig)
-        
-        return buf
-        
-    except Exception as e:
-        print(f"Error creating frame at {current_time}s: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+def _minmax_envelope(y, sr, max_points):
+    """Per-bin min/max of a waveform, interleaved so a line plot draws the same outline"""
+    if len(y) <= max_points:
+        return np.arange(len(y)) / sr, y
+    
+    n_bins = max_points // 2
+    bin_len = int(np.ceil(len(y) / n_bins))
+    n_bins = int(np.ceil(len(y) / bin_len))
+    
+    # Full bins as a reshaped view of y, the short last bin on its own -
+    # no padded copy of the signal
+    n_full = len(y) // bin_len
+    bins = y[:n_full * bin_len].reshape(n_full, bin_len)
+    lows, highs = bins.min(axis=1), bins.max(axis=1)
+    if n_full < n_bins:
+        tail = y[n_full * bin_len:]
+        lows, highs = np.append(lows, tail.min()), np.append(highs, tail.max())
+    
+    times = np.repeat((np.arange(n_bins) + 0.5) * bin_len / sr, 2)
+    values = np.column_stack([lows, highs]).ravel()
+    return times, values
 
 
-def generate_video_report(df, notes_df, beat_times, audio_path, output_path):
-    """Generate synchronized video report with audio"""
-    try:
-        from moviepy.editor import VideoClip, AudioFileClip
-        import librosa
-        
-        # Load audio duration
-        audio_duration = librosa.get_duration(path=audio_path)
-        
-        print(f"Generating video: {audio_duration:.2f}s duration")
-        
-        # Test create first frame to catch errors early
-        test_frame = create_video_frame(df, notes_df, 0, audio_duration)
-        if test_frame is None:
-            raise Exception("Failed to create test frame")
-        
-        print(f"Test frame created successfully: {test_frame.shape}")
-        
-        # Create video clip
-        def make_frame(t):
-            frame = create_video_frame(df, notes_df, t, audio_duration)
-            if frame is None:
-                print(f"Warning: Failed to create frame at t={t:.2f}s, using last good frame")
-                # Return a blank frame of the same size as test frame
-                return test_frame
-            return frame
-        
-        print("Creating video clip...")
-        # Create video at 10 fps
-        video = VideoClip(make_frame, duration=audio_duration)
-        video = video.set_fps(10)
-        
-        print("Loading audio...")
-        # Add audio
-        audio = AudioFileClip(audio_path)
-        final_video = video.set_audio(audio)
-        
-        print(f"Writing video to {output_path}...")
-        # Write video file
-        final_video.write_videofile(
-            output_path,
-            fps=10,
-            codec='libx264',
-            audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True,
-            verbose=False,
-            logger=None
-        )
-        
-        print("Video generation complete!")
-        
-        # Clean up
-        video.close()
-        audio.close()
-        final_video.close()
-        
-        return {
-            'success': True,
-            'video_path': output_path,
-            'duration': audio_duration
-        }
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"Video generation error: {error_details}")
-        return {
-            'success': False,
-            'error': f"{str(e)}\n\nDetails:\n{error_details}"
-        }
+# Legend proxies - only their style is read, the legend draws its own copies,
+# so one set serves every figure
+WAVEFORM_LEGEND = [
+    Line2D([0], [0], color='blue', linewidth=1, label='Audio Signal'),
+    Line2D([0], [0], color='red', linestyle='--', linewidth=2, label='Detected Beats')
+]
+TUNING_LEGEND = [
+    Rectangle((0,0), 1, 1, facecolor='green', alpha=0.7, label='In tune (≤10¢)'),
+    Rectangle((0,0), 1, 1, facecolor='yellow', alpha=0.7, label='Slightly off (≤25¢)'),
+    Rectangle((0,0), 1, 1, facecolor='red', alpha=0.7, label='Out of tune (>25¢)'),
+    Line2D([0], [0], color='red', linestyle=':', linewidth=1, label='Metronome')
+]
 
+PITCH_COLUMNS = ('time_s', 'f0', 'ideal_freq', 'cents_off')
+NOTE_COLUMNS = ('start_time', 'end_time', 'duration', 'note_name', 'avg_cents_off')
 
 
-def visualize_metronome_detection(y, sr, beat_times, filepath):
+def _columns(table, columns):
+    """Dict of contiguous NumPy arrays from a DataFrame (or an existing dict of
+    arrays), float columns as float32 like the pipeline's frames"""
+    arrays = {}
+    for col in columns:
+        values = np.asarray(table[col])
+        if values.dtype.kind == 'f':
+            values = values.astype(np.float32, copy=False)
+        arrays[col] = np.ascontiguousarray(values)
+    return arrays
+
+
+def visualize_metronome_detection(y, sr, beat_times, onset_env, filepath):
     """Create visualization of waveform with detected beats highlighted"""
     try:
-        # Create time array for x-axis
-        duration = len(y) / sr
-        time = np.linspace(0, duration, len(y))
+        width, dpi = _figure_size(len(y) / sr)
+        
+        # Two points (min/max) per horizontal pixel is all the figure can show
+        max_points = int(2 * width * dpi)
         
         # Create figure with 2 subplots
-        fig, (ax1, ax2) = plt.subplots(
-            2, 1, 
-            figsize=(VIZ_PARAMS['figure_width'], VIZ_PARAMS['figure_height'])
-        )
+        fig = _figure(figsize=(width, VIZ_PARAMS['figure_height']))
+        ax1, ax2 = fig.subplots(2, 1)
         
         # Plot 1: Full waveform with beat markers
-        ax1.plot(time, y, alpha=0.6, linewidth=0.5, color='blue', label='Waveform')
+        ax1.plot(*_minmax_envelope(y, sr, max_points), alpha=0.6, linewidth=0.5, color='blue', label='Waveform')
         ax1.set_xlabel('Time (seconds)', fontsize=12)
         ax1.set_ylabel('Amplitude', fontsize=12)
         ax1.set_title('Audio Waveform with Detected Metronome Beats', fontsize=14, fontweight='bold')
         ax1.grid(True, alpha=0.3)
         
         # Mark detected beats with vertical lines
-        for beat_time in beat_times:
-            ax1.axvline(x=beat_time, color='red', linestyle='--', linewidth=2, alpha=0.7)
+        ax1.vlines(beat_times, 0, 1, transform=ax1.get_xaxis_transform(), colors='red', linestyles='--', linewidth=2, alpha=0.7)
         
         # Add legend
-        legend_elements = [
-            Line2D([0], [0], color='blue', linewidth=1, label='Audio Signal'),
-            Line2D([0], [0], color='red', linestyle='--', linewidth=2, label='Detected Beats')
-        ]
-        ax1.legend(handles=legend_elements, loc='upper right')
-        
-        # Plot 2: Band-pass filtered signal (what the detector sees)
-        sos = signal.butter(4, [800, 4000], 'bp', fs=sr, output='sos')
-        y_filtered = signal.sosfilt(sos, y)
+        ax1.legend(handles=WAVEFORM_LEGEND, loc='upper right')
         
-        ax2.plot(time, y_filtered, alpha=0.6, linewidth=0.5, color='green', label='Filtered (800-4000Hz)')
+        # Plot 2: Click-band onset strength, reused from detect_metronome
+        # (what the detector actually peak-picks)
+        onset_times = np.arange(len(onset_env)) * AUDIO_PARAMS['hop_length'] / sr
+        band_label = f"Onset strength ({METRONOME_PARAMS['band_low']}-{METRONOME_PARAMS['band_high']}Hz)"
+        ax2.plot(onset_times, onset_env, alpha=0.8, linewidth=0.8, color='green', label=band_label)
         ax2.set_xlabel('Time (seconds)', fontsize=12)
-        ax2.set_ylabel('Amplitude', fontsize=12)
-        ax2.set_title('Band-Pass Filtered Signal (What Metronome Detector Sees)', fontsize=14, fontweight='bold')
+        ax2.set_ylabel('Onset Strength', fontsize=12)
+        ax2.set_title('Click-Band Onset Strength (What Metronome Detector Sees)', fontsize=14, fontweight='bold')
         ax2.grid(True, alpha=0.3)
         
-        # Mark detected beats on filtered signal too
-        for beat_time in beat_times:
-            ax2.axvline(x=beat_time, color='red', linestyle='--', linewidth=2, alpha=0.7)
+        # Mark detected beats on the onset envelope too
+        ax2.vlines(beat_times, 0, 1, transform=ax2.get_xaxis_transform(), colors='red', linestyles='--', linewidth=2, alpha=0.7)
         
         ax2.legend(loc='upper right')
         
-        plt.tight_layout()
-        
-        # Save the plot
-        plot_filename = filepath.replace('.ogg', '_metronome_analysis.png')
-        plt.savefig(plot_filename, dpi=VIZ_PARAMS['dpi'], bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        
+        # Encode the plot in memory - the caller sends the bytes and decides
+        # whether plot_path is ever written
+        plot_filename = os.path.splitext(filepath)[0] + '_metronome_analysis.png'
+        png = BytesIO()
+        fig.savefig(
+            png,
+            format='png',
+            dpi=dpi,
+            bbox_inches='tight',
+            pil_kwargs={'compress_level': VIZ_PARAMS['png_compress_level']}
+        )
         
         return {
             'success': True,
-            'plot_path': plot_filename
+            'plot_path': plot_filename,
+            'plot_png': png.getvalue()
         }
     except Exception as e:
         return {
@@ -526,26 +148,29 @@ def visualize_metronome_detection(y, sr, beat_times, filepath):
 
 
 def visualize_pitch_and_notes(df, notes_df, beat_times, filepath):
-    """Create comprehensive visualization with pitch, notes, and timing"""
+    """Create comprehensive visualization with pitch, notes, and timing
+    
+    df may be a DataFrame or the pipeline's dict of per-frame arrays
+    """
     try:
+        # Columns as arrays once, instead of a Series per plot call
+        pitch = _columns(df, PITCH_COLUMNS + ('is_onset',))
+        width, dpi = _figure_size(pitch['time_s'][-1] if len(pitch['time_s']) else 0)
+        
         # Create figure with 3 subplots
-        fig, (ax1, ax2, ax3) = plt.subplots(
-            3, 1,
-            figsize=(VIZ_PARAMS['figure_width'], VIZ_PARAMS['figure_height'] + 4)
-        )
+        fig = _figure(figsize=(width, VIZ_PARAMS['figure_height'] + 4))
+        ax1, ax2, ax3 = fig.subplots(3, 1)
         
         # Plot 1: Pitch over time with note labels
-        ax1.plot(df['time_s'], df['f0'], color='blue', linewidth=1, alpha=0.7, label='Detected Pitch')
-        ax1.plot(df['time_s'], df['ideal_freq'], color='gray', linewidth=1, linestyle='--', alpha=0.5, label='Ideal Frequency')
+        ax1.plot(pitch['time_s'], pitch['f0'], color='blue', linewidth=1, alpha=0.7, label='Detected Pitch')
+        ax1.plot(pitch['time_s'], pitch['ideal_freq'], color='gray', linewidth=1, linestyle='--', alpha=0.5, label='Ideal Frequency')
         
         # Add metronome beats
-        for beat_time in beat_times:
-            ax1.axvline(x=beat_time, color='red', linestyle=':', linewidth=1, alpha=0.4)
+        ax1.vlines(beat_times, 0, 1, transform=ax1.get_xaxis_transform(), colors='red', linestyles=':', linewidth=1, alpha=0.4)
         
         # Mark note onsets
-        onset_times = df[df['is_onset']]['time_s'].values
-        for onset_time in onset_times:
-            ax1.axvline(x=onset_time, color='green', linestyle='-', linewidth=1.5, alpha=0.6)
+        onset_times = pitch['time_s'][pitch['is_onset']]
+        ax1.vlines(onset_times, 0, 1, transform=ax1.get_xaxis_transform(), colors='green', linestyles='-', linewidth=1.5, alpha=0.6)
         
         ax1.set_xlabel('Time (seconds)', fontsize=11)
         ax1.set_ylabel('Frequency (Hz)', fontsize=11)
@@ -560,47 +185,38 @@ def visualize_pitch_and_notes(df, notes_df, beat_times, filepath):
         ax2.grid(True, alpha=0.3, axis='x')
         
         # Add metronome beats
-        for beat_time in beat_times:
-            ax2.axvline(x=beat_time, color='red', linestyle=':', linewidth=1, alpha=0.4)
+        ax2.vlines(beat_times, 0, 1, transform=ax2.get_xaxis_transform(), colors='red', linestyles=':', linewidth=1, alpha=0.4)
         
         # Draw note segments as colored rectangles
-        y_pos = 0
-        unique_notes_list = notes_df['note_name'].unique()
-        note_to_y = {note: i for i, note in enumerate(unique_notes_list)}
+        notes = _columns(notes_df, NOTE_COLUMNS)
+        # Row of every note in one pass, rows in order of first appearance
+        y_positions, unique_notes_list = pd.factorize(notes['note_name'])
         
-        for _, note in notes_df.iterrows():
-            y_position = note_to_y[note['note_name']]
+        if len(y_positions) > 0:
             
-            # Color based on tuning accuracy
-            abs_cents = abs(note['avg_cents_off'])
-            if abs_cents <= 10:
-                color = 'green'
-                alpha = 0.7
-            elif abs_cents <= 25:
-                color = 'yellow'
-                alpha = 0.7
-            else:
-                color = 'red'
-                alpha = 0.7
+            # Color based on tuning accuracy: <=10 green, <=25 yellow, else red
+            tuning = np.digitize(np.abs(notes['avg_cents_off']), [10, 25], right=True)
+            facecolors = to_rgba_array(['green', 'yellow', 'red'])[tuning]
             
-            # Draw rectangle for note duration
-            rect = Rectangle(
-                (note['start_time'], y_position - 0.4),
-                note['duration'],
-                0.8,
-                facecolor=color,
-                alpha=alpha,
-                edgecolor='black',
-                linewidth=0.5
-            )
-            ax2.add_patch(rect)
+            # All note boxes as one collection instead of a patch per note
+            rects = [
+                Rectangle((start, y - 0.4), duration, 0.8)
+                for start, duration, y in zip(notes['start_time'], notes['duration'], y_positions)
+            ]
+            ax2.add_collection(PatchCollection(
+                rects,
+                facecolors=facecolors,
+                edgecolors='black',
+                linewidths=0.5,
+                alpha=0.7
+            ))
             
-            # Add note label
-            if note['duration'] > 0.3:  # Only label if note is long enough
+            # Labels only for notes long enough to hold them
+            for i in np.flatnonzero(notes['duration'] > 0.3):
                 ax2.text(
-                    note['start_time'] + note['duration']/2,
-                    y_position,
-                    note['note_name'],
+                    notes['start_time'][i] + notes['duration'][i]/2,
+                    y_positions[i],
+                    notes['note_name'][i],
                     ha='center',
                     va='center',
                     fontsize=8,
@@ -612,25 +228,19 @@ def visualize_pitch_and_notes(df, notes_df, beat_times, filepath):
         ax2.set_ylim(-0.5, len(unique_notes_list) - 0.5)
         
         # Legend for tuning colors
-        legend_elements = [
-            Rectangle((0,0), 1, 1, facecolor='green', alpha=0.7, label='In tune (≤10¢)'),
-            Rectangle((0,0), 1, 1, facecolor='yellow', alpha=0.7, label='Slightly off (≤25¢)'),
-            Rectangle((0,0), 1, 1, facecolor='red', alpha=0.7, label='Out of tune (>25¢)'),
-            Line2D([0], [0], color='red', linestyle=':', linewidth=1, label='Metronome')
-        ]
-        ax2.legend(handles=legend_elements, loc='upper right', fontsize=9)
+        ax2.legend(handles=TUNING_LEGEND, loc='upper right', fontsize=9)
         
         # Plot 3: Cents deviation over time
-        ax3.plot(df['time_s'], df['cents_off'], color='purple', linewidth=1, alpha=0.7)
+        ax3.plot(pitch['time_s'], pitch['cents_off'], color='purple', linewidth=1, alpha=0.7)
         ax3.axhline(y=0, color='black', linestyle='-', linewidth=1)
-        ax3.axhline(y=10, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=-10, color='green', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=25, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
-        ax3.axhline(y=-25, color='orange', linestyle='--', linewidth=0.8, alpha=0.5)
+        
+        # Tuning zones as bands: in tune within ±10¢, slightly off within ±25¢
+        ax3.axhspan(-10, 10, facecolor='green', alpha=0.08)
+        ax3.axhspan(10, 25, facecolor='orange', alpha=0.06)
+        ax3.axhspan(-25, -10, facecolor='orange', alpha=0.06)
         
         # Add metronome beats
-        for beat_time in beat_times:
-            ax3.axvline(x=beat_time, color='red', linestyle=':', linewidth=1, alpha=0.4)
+        ax3.vlines(beat_times, 0, 1, transform=ax3.get_xaxis_transform(), colors='red', linestyles=':', linewidth=1, alpha=0.4)
         
         ax3.set_xlabel('Time (seconds)', fontsize=11)
         ax3.set_ylabel('Cents Deviation', fontsize=11)
@@ -638,19 +248,35 @@ def visualize_pitch_and_notes(df, notes_df, beat_times, filepath):
         ax3.grid(True, alpha=0.3)
         ax3.set_ylim(-50, 50)
         
-        plt.tight_layout()
-        
-        # Save the plot
-        plot_filename = filepath.replace('.ogg', '_pitch_analysis.png')
-        plt.savefig(plot_filename, dpi=VIZ_PARAMS['dpi'], bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        
+        # Encode the plot in memory - the caller sends the bytes and decides
+        # whether plot_path is ever written
+        plot_filename = os.path.splitext(filepath)[0] + '_pitch_analysis.png'
+        png = BytesIO()
+        fig.savefig(
+            png,
+            format='png',
+            dpi=dpi,
+            bbox_inches='tight',
+            pil_kwargs={'compress_level': VIZ_PARAMS['png_compress_level']}
+        )
         
         return {
             'success': True,
-            'plot_path': plot_filename
+            'plot_path': plot_filename,
+            'plot_png': png.getvalue()
         }
     except Exception as e:
         return {
             'success': False,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+
+def warmup():
+    """Draw a throwaway figure so matplotlib's fonts and backend are loaded"""
+    fig = _figure()
+    ax = fig.subplots()
+    ax.plot([0, 1], [0, 1])
+    fig.canvas.draw()
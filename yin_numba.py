@@ -0,0 +1,93 @@
+"""Numba-compiled YIN pitch estimator for Practice Buddy Bot"""
+import numpy as np
+from numba import njit, prange
+
+
+def _njit(**options):
+    """njit with on-disk caching, compiled in memory when numba can't find a
+    writable cache location (e.g. read-only installs)"""
+    def decorate(func):
+        try:
+            return njit(cache=True, **options)(func)
+        except RuntimeError:
+            return njit(**options)(func)
+    return decorate
+
+
+@_njit(parallel=True, fastmath=True)
+def _yin_periods(y, n_frames, frame_length, hop_length, min_period, max_period, threshold):
+    """Best period (in samples) for every frame, NaN for silent ones - steps
+    2-5 of de Cheveigné & Kawahara, computed the way librosa.yin does"""
+    periods = np.empty(n_frames)
+
+    for t in prange(n_frames):
+        frame = y[t * hop_length:t * hop_length + frame_length]
+
+        # Step 2: difference function over the whole frame, as librosa forms
+        # it from the autocorrelation: d(tau) = 2 * (r(0) - r(tau)) - sum of
+        # the first tau squared samples
+        d = np.zeros(max_period + 1)
+        r0 = np.dot(frame, frame)
+        energy = 0.0
+        for tau in range(1, max_period + 1):
+            energy += frame[tau - 1] * frame[tau - 1]
+            d[tau] = 2 * (r0 - np.dot(frame[:frame_length - tau], frame[tau:])) - energy
+
+        # Step 3: cumulative mean normalized difference (running sum). A
+        # frame of digital silence has no period at all
+        cmnd = np.empty(max_period + 1)
+        running = 0.0
+        for tau in range(1, max_period + 1):
+            running += d[tau]
+            cmnd[tau] = d[tau] * tau / running if running > 0 else 0.0
+        if running <= 0:
+            periods[t] = np.nan
+            continue
+
+        # Step 4: absolute threshold - the first local minimum in
+        # [min_period, max_period] below it, the global minimum if none is
+        best = -1
+        for tau in range(min_period, max_period + 1):
+            if cmnd[tau] >= threshold:
+                continue
+            if tau == max_period:
+                trough = cmnd[tau] < cmnd[tau - 1]
+            elif tau == min_period:
+                trough = cmnd[tau] < cmnd[tau + 1]
+            else:
+                trough = cmnd[tau] < cmnd[tau - 1] and cmnd[tau] <= cmnd[tau + 1]
+            if trough:
+                best = tau
+                break
+
+        if best < 0:
+            best = min_period
+            for tau in range(min_period + 1, max_period + 1):
+                if cmnd[tau] < cmnd[best]:
+                    best = tau
+
+        # Step 5: parabolic interpolation around the chosen period
+        period = float(best)
+        if min_period < best < max_period:
+            a = cmnd[best + 1] + cmnd[best - 1] - 2 * cmnd[best]
+            b = (cmnd[best + 1] - cmnd[best - 1]) / 2
+            if abs(b) < abs(a):
+                period -= b / a
+
+        periods[t] = period
+
+    return periods
+
+
+def yin(y, sr, fmin, fmax, hop_length, frame_length=2048, threshold=0.1):
+    """Estimate f0 (Hz) for centered frames, like librosa.yin (NaN where a
+    frame is silent)"""
+    # Pad so frames are centered on t = frame * hop_length / sr
+    y = np.pad(np.ascontiguousarray(y, dtype=np.float32), frame_length // 2)
+    n_frames = 1 + (len(y) - frame_length) // hop_length
+
+    min_period = int(np.floor(sr / fmax))
+    max_period = min(int(np.ceil(sr / fmin)), frame_length - 1)
+
+    periods = _yin_periods(y, n_frames, frame_length, hop_length, min_period, max_period, threshold)
+    return sr / periods